@@ -27,6 +27,7 @@ class CategoryAdmin(admin.ModelAdmin):
 
     '''Admin View for Category'''
     list_display = ('path', 'name', 'parent', 'created_at', 'updated_at')
+    list_select_related = ('parent',)
     search_fields = ['name', ]
 
 
@@ -1,6 +1,32 @@
 from django.apps import AppConfig
+from django.core.signals import request_finished
+from django.db.models.signals import post_save, post_delete, m2m_changed
+import atexit
 
 
 class CJDataAppConfig(AppConfig):
     name = 'cjdata'
     verbose_name = "Criminal Justice Data"
+
+    def ready(self):
+        from cjdata.categories import clear_category_tree
+        Category = self.get_model('Category')
+        post_save.connect(clear_category_tree, sender=Category, dispatch_uid='clear_category_tree_on_save')
+        post_delete.connect(clear_category_tree, sender=Category, dispatch_uid='clear_category_tree_on_delete')
+
+        from cjdata.cache import bump_catalog_version
+        Dataset = self.get_model('Dataset')
+        for model in (Dataset, Category):
+            post_save.connect(bump_catalog_version, sender=model,
+                              dispatch_uid='bump_catalog_version_on_{}_save'.format(model._meta.model_name))
+            post_delete.connect(bump_catalog_version, sender=model,
+                                dispatch_uid='bump_catalog_version_on_{}_delete'.format(model._meta.model_name))
+        m2m_changed.connect(bump_catalog_version, sender=Dataset.categories.through,
+                            dispatch_uid='bump_catalog_version_on_dataset_categories')
+
+        # Repeat cache invalidations made inside transactions once they're committed
+        from celery.signals import task_postrun
+        from common.utils import run_after_transaction
+        request_finished.connect(run_after_transaction, dispatch_uid='run_after_transaction')
+        task_postrun.connect(run_after_transaction, dispatch_uid='run_after_transaction')
+        atexit.register(run_after_transaction)
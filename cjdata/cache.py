@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.cache import cache
+from common.utils import repeat_after_transaction
+import hashlib
+import json
+import time
+
+CATALOG_VERSION_KEY = 'cjdata:catalog:version'
+LIST_PAGE_KEY = 'cjdata:list_page:{}:{}'
+# The only GET parameters a cached list page may have; other parameters end up in its links
+LIST_PAGE_PARAMS = ('selected_facets', 'page')
+
+
+def catalog_version():
+    '''A number in the shared cache that changes whenever a Dataset or Category is written'''
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, int(time.time()), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version(**kwargs):
+    '''
+    Make every process stop using list pages cached before a write. Connected to Dataset and Category signals,
+    which fire before the write is committed, so it's bumped again after the request or task that wrote.
+    '''
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, int(time.time()), None)
+    repeat_after_transaction(bump_catalog_version)
+
+
+def list_page_timeout():
+    return getattr(settings, 'LIST_PAGE_CACHE_TIMEOUT', 60 * 60)
+
+
+def list_page_cache_key(request):
+    '''
+    Cache key for a dataset list page, from its path (the category or location), its selected facets
+    (order and duplicates don't matter) and page number, and the catalog version. None if the request
+    has any other GET parameters.
+    '''
+    if any(param not in LIST_PAGE_PARAMS for param in request.GET):
+        return None
+    normalized = {
+        'path': request.path,
+        'selected_facets': sorted(set(request.GET.getlist('selected_facets'))),
+        'page': request.GET.get('page', '1'),
+    }
+    digest = hashlib.sha1(json.dumps(normalized, sort_keys=True).encode('utf-8')).hexdigest()
+    return LIST_PAGE_KEY.format(catalog_version(), digest)
+
+
+def datasets_table_key(dataset_ids):
+    '''The vary-on value for a cached datasets table fragment: the catalog version and the datasets shown, in order'''
+    digest = hashlib.sha1(','.join(str(pk) for pk in dataset_ids).encode('utf-8')).hexdigest()
+    return '{}:{}'.format(catalog_version(), digest)
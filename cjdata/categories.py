@@ -0,0 +1,166 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from cjdata.models import Category
+from common.utils import repeat_after_transaction
+import time
+
+
+class CategoryNode(object):
+
+    """A lightweight, read-only stand-in for a Category, linked to its parent and children."""
+
+    def __init__(self, id, name, slug, parent_id):
+        self.id = self.pk = id
+        self.name = name
+        self.slug = slug
+        self.parent_id = parent_id
+        self.parent = None
+        self.children = []
+
+    @property
+    def path(self):
+        return "/".join(node.name for node in self.lineage)
+
+    @property
+    def slugged_path(self):
+        return "/".join(node.slug for node in self.lineage)
+
+    @property
+    def ancestors(self):
+        '''Parent, grandparent, etc., closest first'''
+        ancestors = []
+        node = self.parent
+        while node is not None:
+            ancestors.append(node)
+            node = node.parent
+        return ancestors
+
+    @property
+    def lineage(self):
+        '''Ancestors from the top-level category down, followed by this node'''
+        return list(reversed(self.ancestors)) + [self]
+
+    @property
+    def descendant_ids(self):
+        ids = []
+        for child in self.children:
+            ids.append(child.id)
+            ids.extend(child.descendant_ids)
+        return ids
+
+    def get_absolute_url(self):
+        kwargs = {'category': self.parent.slug if self.parent else self.slug}
+        if self.parent:
+            kwargs['subcategory'] = self.slug
+        return reverse('datasets-by-category', kwargs=kwargs)
+
+    def __str__(self):
+        return self.path
+
+
+class CategoryTree(object):
+
+    """
+    The whole category tree, loaded with a single query.
+    Nodes are kept in Category's default ordering, both in roots and in each node's children.
+    """
+
+    def __init__(self, rows):
+        self.nodes = {}
+        self.roots = []
+        for row in rows:
+            self.nodes[row['id']] = CategoryNode(**row)
+        for row in rows:
+            node = self.nodes[row['id']]
+            parent = self.nodes.get(node.parent_id, None)
+            if parent is None:
+                self.roots.append(node)
+            else:
+                node.parent = parent
+                parent.children.append(node)
+        self._paths = dict((node.id, (node.path, node.slugged_path)) for node in self.nodes.values())
+
+    @staticmethod
+    def load_rows():
+        return list(Category.objects.values('id', 'name', 'slug', 'parent_id'))
+
+    def get(self, category_id):
+        return self.nodes.get(category_id, None)
+
+    def path(self, category_id):
+        return self._paths[category_id][0]
+
+    def slugged_path(self, category_id):
+        return self._paths[category_id][1]
+
+    def children(self, category_id):
+        return self.nodes[category_id].children
+
+    def ancestors(self, category_id):
+        return self.nodes[category_id].ancestors
+
+    def find(self, slug, parent_id=None):
+        '''Find a category by slug among the children of parent_id (or the top-level categories)'''
+        siblings = self.roots if parent_id is None else self.children(parent_id)
+        for node in siblings:
+            if node.slug == slug:
+                return node
+        return None
+
+
+CATEGORY_TREE_VERSION_KEY = 'cjdata:category_tree:version'
+CATEGORY_TREE_ROWS_KEY = 'cjdata:category_tree:rows:{}'
+# Cached rows are only a shortcut for loading the tree, so they expire in case a
+# process cached rows read before another process's changes were committed.
+CATEGORY_TREE_ROWS_TIMEOUT = 10 * 60
+
+_tree = None
+_tree_version = None
+_checked_at = None
+
+
+def category_tree_version():
+    '''The shared tree version. Every process reloads its tree when this changes.'''
+    version = cache.get(CATEGORY_TREE_VERSION_KEY)
+    if version is None:
+        cache.add(CATEGORY_TREE_VERSION_KEY, int(time.time()), None)
+        version = cache.get(CATEGORY_TREE_VERSION_KEY)
+    return version
+
+
+def category_tree():
+    '''
+    The process-wide category tree. At most every CATEGORY_TREE_CHECK_INTERVAL seconds, this checks the
+    shared tree version and, if it changed, rebuilds the tree from rows in the shared cache (or the database).
+    '''
+    global _tree, _tree_version, _checked_at
+    now = time.time()
+    check_interval = getattr(settings, 'CATEGORY_TREE_CHECK_INTERVAL', 5)
+    if _tree is None or _checked_at is None or now - _checked_at >= check_interval:
+        version = category_tree_version()
+        if _tree is None or version != _tree_version:
+            rows_key = CATEGORY_TREE_ROWS_KEY.format(version)
+            rows = cache.get(rows_key)
+            if rows is None:
+                rows = CategoryTree.load_rows()
+                cache.set(rows_key, rows, CATEGORY_TREE_ROWS_TIMEOUT)
+            _tree = CategoryTree(rows)
+            _tree_version = version
+        _checked_at = now
+    return _tree
+
+
+def clear_category_tree(**kwargs):
+    '''
+    Bump the shared tree version, so every process reloads its tree, and drop this process's tree now.
+    Connected to Category signals, which fire before the change is committed, so it's done again after
+    the request or task that made the change (a process could reload the old rows in between).
+    '''
+    global _tree
+    try:
+        cache.incr(CATEGORY_TREE_VERSION_KEY)
+    except ValueError:
+        cache.set(CATEGORY_TREE_VERSION_KEY, int(time.time()), None)
+    _tree = None
+    repeat_after_transaction(clear_category_tree)
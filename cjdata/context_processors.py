@@ -1,8 +1,9 @@
-from cjdata.models import Category, STATE_NATL_CHOICES
+from cjdata.categories import category_tree
+from cjdata.models import STATE_NATL_CHOICES
 
 
 def main_categories(request):
-    return {'main_categories': Category.objects.filter(parent__isnull=True)}
+    return {'main_categories': category_tree().roots}
 
 
 def state_choices(request):
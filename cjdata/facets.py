@@ -0,0 +1,47 @@
+from django.db import connection
+from django.db.models import Count
+
+ARRAY_FACET_FIELDS = ('states', 'sectors')
+VALUE_FACET_FIELDS = ('group_name', 'access_type')
+
+
+def array_facet_counts(queryset, fieldname):
+    '''
+    Count each value of an ArrayField across a queryset, unnesting the array in the database.
+    Returns a list of (value, count) tuples, most common first.
+    '''
+    model = queryset.model
+    qn = connection.ops.quote_name
+    id_sql, id_params = queryset.order_by().values('pk').query.sql_with_params()
+    sql = ("SELECT facet.value, COUNT(*) AS num FROM "
+           "(SELECT unnest({column}) AS value FROM {table} WHERE {pk} IN ({id_sql})) AS facet "
+           "GROUP BY facet.value ORDER BY num DESC, facet.value").format(
+        column=qn(model._meta.get_field(fieldname).column),
+        table=qn(model._meta.db_table),
+        pk=qn(model._meta.pk.column),
+        id_sql=id_sql)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, id_params)
+        return [(value, count) for value, count in cursor.fetchall()]
+
+
+def value_facet_counts(queryset, fieldname):
+    '''
+    Count each value of a regular field across a queryset with a GROUP BY.
+    Returns a list of (value, count) tuples, most common first.
+    '''
+    counts = (queryset.order_by()
+                      .values_list(fieldname)
+                      .annotate(num=Count('pk', distinct=True))
+                      .order_by('-num', fieldname))
+    return [(value, count) for value, count in counts]
+
+
+def facet_counts(queryset):
+    '''Build the states/sectors/group_name/access_type facet counts used by the dataset list pages'''
+    facets = {}
+    for fieldname in ARRAY_FACET_FIELDS:
+        facets[fieldname] = array_facet_counts(queryset, fieldname)
+    for fieldname in VALUE_FACET_FIELDS:
+        facets[fieldname] = value_facet_counts(queryset, fieldname)
+    return facets
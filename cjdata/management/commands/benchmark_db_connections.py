@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.test import Client
+from crawler.models import URLInspection
+import threading
+import time
+
+
+class Command(BaseCommand):
+    help = ('Reports requests per second for a page and crawl-like tasks per second, from concurrent threads, '
+            'with the database connection settings in effect (compare runs with and without DATABASE_POOL_SIZE)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url',
+                            dest='url',
+                            default='/',
+                            help='Page to request (default: the home page)')
+        parser.add_argument('-n', '--number',
+                            type=int,
+                            dest='number',
+                            default=500,
+                            help='Number of requests, and of tasks')
+        parser.add_argument('-c', '--concurrency',
+                            type=int,
+                            dest='concurrency',
+                            default=10,
+                            help='Number of threads')
+
+    def run_threads(self, work, number, concurrency):
+        '''Call work() number times from concurrency threads, returning calls per second'''
+        remaining = [number]
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        break
+                    remaining[0] -= 1
+                work()
+            connection.close()
+
+        threads = [threading.Thread(target=worker) for i in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return number / (time.perf_counter() - start)
+
+    def request(self, url):
+        response = Client().get(url)
+        if hasattr(response, 'streaming_content'):
+            for chunk in response.streaming_content:
+                pass
+
+    def crawl_task(self, pids):
+        # A crawl batch's reads, closed afterwards like a worker's connections (workers set CONN_MAX_AGE to 0)
+        close_old_connections()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            pids.add(cursor.fetchone()[0])
+        list(URLInspection.objects.order_by('-id').values_list('url', 'exists')[:50])
+        connection.close()
+
+    def handle(self, *args, **options):
+        number = max(options['number'], 1)
+        concurrency = max(options['concurrency'], 1)
+        url = options['url']
+        settings_dict = connection.settings_dict
+
+        self.stdout.write("engine\t{}".format(settings_dict['ENGINE']))
+        self.stdout.write("conn_max_age\t{}".format(settings_dict.get('CONN_MAX_AGE', 0)))
+        self.stdout.write("pool_size\t{}".format(settings_dict.get('POOL_SIZE', '')))
+        self.stdout.write("requests_per_second\t{:.1f}".format(
+            self.run_threads(lambda: self.request(url), number, concurrency)))
+        pids = set()
+        self.stdout.write("tasks_per_second\t{:.1f}".format(
+            self.run_threads(lambda: self.crawl_task(pids), number, concurrency)))
+        self.stdout.write("task_connections\t{}".format(len(pids)))
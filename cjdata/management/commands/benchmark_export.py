@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from cjdata.models import Category, Dataset
+from common.utils import export_fieldnames, generate_csv
+import time
+
+
+class Command(BaseCommand):
+    help = 'Times CSV exports of increasing numbers of datasets and reports the number of queries each one runs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes',
+                            dest='sizes',
+                            default='100,1000,10000',
+                            help='Comma-separated numbers of datasets to export')
+        parser.add_argument('--fake',
+                            action='store_true',
+                            dest='fake',
+                            default=False,
+                            help='Create fake datasets (rolled back afterwards) if there are fewer than the largest size')
+
+    def create_fake_datasets(self, count):
+        categories = list(Category.objects.all())
+        datasets = [Dataset(title='Benchmark dataset {}'.format(i), group_name='Benchmark group {}'.format(i % 50),
+                            states=['US', 'NC'], sectors=['Government'], tags=['benchmark'])
+                    for i in range(count)]
+        Dataset.objects.bulk_create(datasets, batch_size=1000)
+        if categories:
+            DatasetCategory = Dataset.categories.through
+            new_ids = Dataset.objects.filter(title__startswith='Benchmark dataset ').values_list('id', flat=True)
+            links = [DatasetCategory(dataset_id=dataset_id, category_id=categories[i % len(categories)].id)
+                     for i, dataset_id in enumerate(new_ids)]
+            DatasetCategory.objects.bulk_create(links, batch_size=1000)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options.get('sizes').split(','))
+        fieldnames = export_fieldnames(Dataset)
+
+        with transaction.atomic():
+            missing = sizes[-1] - Dataset.objects.count()
+            if missing > 0:
+                if options.get('fake', False):
+                    self.stdout.write("Creating {} fake datasets".format(missing))
+                    self.create_fake_datasets(missing)
+                else:
+                    self.stderr.write("Only {} datasets to export, use --fake to add more".format(sizes[-1] - missing))
+
+            self.stdout.write("datasets\trows\tqueries\tms")
+            for size in sizes:
+                queryset = Dataset.objects.order_by('pk')[:size]
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    num_rows = sum(1 for line in generate_csv(queryset, fieldnames)) - 1
+                    elapsed = time.perf_counter() - start
+                self.stdout.write("{}\t{}\t{}\t{:.1f}".format(size, num_rows, len(queries), elapsed * 1000))
+
+            # Never keep fake datasets
+            transaction.set_rollback(True)
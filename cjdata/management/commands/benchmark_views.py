@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.db.models import Q
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from cjdata.models import Category, Dataset, STATE_NATL_CHOICES
+import time
+
+
+class Command(BaseCommand):
+    help = 'Requests category and location list pages and reports dataset counts, query counts and timings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-r', '--repeat',
+                            type=int,
+                            dest='repeat',
+                            default=5,
+                            help='Number of times to request each page')
+
+    def time_url(self, client, url, repeat):
+        timings = []
+        num_queries = 0
+        for i in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = client.get(url)
+                if hasattr(response, 'streaming_content'):
+                    for chunk in response.streaming_content:
+                        pass
+                timings.append(time.perf_counter() - start)
+            num_queries = len(queries)
+        return min(timings), sum(timings) / len(timings), num_queries
+
+    def write_result(self, url, num_datasets, result):
+        best, mean, num_queries = result
+        self.stdout.write("{}\t{}\t{}\t{:.1f}\t{:.1f}".format(url, num_datasets, num_queries,
+                                                               best * 1000, mean * 1000))
+
+    def handle(self, *args, **options):
+        repeat = max(options.get('repeat', 5), 1)
+        client = Client()
+
+        pages = []
+        for category in Category.objects.select_related('parent'):
+            if category.parent:
+                query = Q(categories=category)
+            else:
+                query = Q(categories=category) | Q(categories__parent=category)
+            num_datasets = Dataset.objects.filter(query).distinct().count()
+            pages.append((category.get_absolute_url(), num_datasets))
+        for abbr, name in STATE_NATL_CHOICES:
+            num_datasets = Dataset.objects.filter(states__contains=[abbr]).count()
+            if num_datasets:
+                pages.append((reverse('datasets-by-location', kwargs={'location': abbr.lower()}), num_datasets))
+
+        self.stdout.write("url\tdatasets\tqueries\tbest_ms\tmean_ms")
+        for url, num_datasets in sorted(pages, key=lambda p: p[1]):
+            self.write_result(url, num_datasets, self.time_url(client, url, repeat))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from cjdata.snapshots import export_snapshots, snapshot_root
+
+
+class Command(BaseCommand):
+    help = 'Writes gzipped CSV snapshots of the full catalog, each category and each state for the export URLs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep',
+                            type=int,
+                            dest='keep',
+                            default=2,
+                            help='Number of snapshot versions to keep, including the new one')
+
+    def handle(self, *args, **options):
+        manifest = export_snapshots(keep=max(options.get('keep', 2), 1))
+        for name, snapshot in sorted(manifest['snapshots'].items()):
+            self.stdout.write("{}\t{}\t{}".format(name, snapshot['rows'], snapshot['size']))
+        self.stdout.write("Wrote {} snapshots to {} (version {})".format(
+            len(manifest['snapshots']), snapshot_root(), manifest['version']))
@@ -2,15 +2,182 @@ from django.core.management.base import BaseCommand
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
+from haystack import connections as haystack_connections
+from haystack.exceptions import NotHandled
 import argparse
+import hashlib
 
+from collections import Counter, defaultdict
 from csv import DictReader
 from itertools import zip_longest
+from cjdata.cache import bump_catalog_version
 from cjdata.models import (Category, Dataset, STATE_NATL_LOOKUP)
+from common.utils import chunked, reserve_ids
+from search.signals import queue_search_update
 import re
 
 validate_url = URLValidator()
 
+# Helper functions for fixing fields
+
+
+def remap_keys(iterable, mapping):
+    '''Some fields need manual remapping to Dataset field names'''
+    for key, value in iterable:
+        if key in mapping and value:
+            key = mapping[key]
+        yield key, value
+
+
+def fields_to_lists(iterable, fields):
+    for key, value in iterable:
+        if key in fields:
+            value = [v.strip() for v in value.split(",") if v.strip() != '']
+        yield key, value
+
+
+def standardize_key(k):
+    '''Many fields can be fixed by lowercasing and replacing certain characters'''
+    return str(k).lower().strip().replace('? (y/n)', '').replace(' ', '_').replace('/', '_')
+
+
+def reformat_keys(iterable, func):
+    '''Iterate over keys and run standardize_key'''
+    for key, value in iterable:
+        new_key = func(key)
+        if value:
+            yield new_key, value
+
+
+def booleanize(iterable, fields):
+    for key, value in iterable:
+        if value and key in fields:
+            value = True if value.lower().startswith('y') else False
+        yield key, value
+
+
+def clean_url(url):
+    url = url.strip()
+    try:
+        validate_url(url)
+        return url
+    except ValidationError:
+        return None
+
+
+def clean_states(states_list):
+    values_set = (v.strip() for v in states_list)
+    values_set = ('US' if v.startswith('Nat') else v for v in values_set)
+    values_set = (v for v in values_set if v in STATE_NATL_LOOKUP.keys())
+    return list(values_set)
+
+
+def make_categories(cat_entry, subcat_entry):
+    category_entries = cat_entry.split(',') if cat_entry else []
+    cat_entries_cleaned = (c.strip() for c in category_entries)
+    subcategory_entries = subcat_entry.split(',') if subcat_entry else []
+    subcat_entries_cleaned = (c.strip() for c in subcategory_entries)
+    cat_zip = zip_longest(cat_entries_cleaned, subcat_entries_cleaned, fillvalue=None)
+    return cat_zip
+
+
+def titlecase(s):
+    return re.sub(r"[A-Za-z]+('[A-Za-z]+)?",
+                  lambda mo: mo.group(0)[0].upper() + mo.group(0)[1:].lower(),
+                  s)
+
+
+def clean_sectors(sectors_list):
+    return list(titlecase(s.strip()) for s in sectors_list)
+
+
+# Some fields need manual remapping to Dataset field names
+KEY_MAPPING = {
+    standardize_key("Private/Government"): "sectors",
+    standardize_key("Is this data updated? (Y/N)"): "updated",
+    # "category": "categories",
+    "internet_availability": "internet_available",
+    "tag": "tags",
+    "state": "states",
+    "format": "formats",
+    "sublocation": "division_names",
+    "location": "resource_location"
+}
+LIST_FIELDS = ("tags", "formats", "sectors", "states", "division_names")
+BOOLEAN_FIELDS = ("mappable", "updated", "population_data", "internet_available")
+# Fields that aren't compared when syncing an existing dataset with a CSV row
+SYNC_EXCLUDED_FIELDS = ("id", "uuid", "created_at", "updated_at")
+
+
+def normalize_row(row):
+    '''
+    Turn a CSV row into a dict of Dataset field values.
+    Returns the dict and an iterable of (category name, subcategory name) tuples.
+    '''
+    # Reformat keys (make lowercase)
+    data_iterable = reformat_keys(row.items(), standardize_key)
+    # Remap keys to model fields
+    data_iterable = remap_keys(data_iterable, KEY_MAPPING)
+    # Make list fields from strings
+    data_iterable = fields_to_lists(data_iterable, LIST_FIELDS)
+    # Coerce select values to booleans
+    data_iterable = booleanize(data_iterable, BOOLEAN_FIELDS)
+    # Back to a dict, clean states, sectors and url
+    item = dict(data_iterable)
+    item['states'] = clean_states(item.get('states', []))
+    item['sectors'] = clean_sectors(item.get('sectors', []))
+    raw_url = item.pop('url', None)
+    if raw_url:
+        item['url'] = clean_url(raw_url)
+
+    # Get category paths
+    category_raw = item.pop('category', None)
+    subcategory_raw = item.pop('subcategory', None)
+    category_tuples = make_categories(category_raw, subcategory_raw)
+
+    return item, category_tuples
+
+
+def dataset_fingerprint(title, group_name, url):
+    '''Stable identifier for a dataset, used to match CSV rows to existing datasets when syncing'''
+    key = "\x1f".join((value or '').strip() for value in (title, group_name, url))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class CategoryLookup(object):
+
+    '''Looks up categories by case-insensitive name, querying the database each time'''
+
+    def top_level(self, name):
+        return Category.objects.get(name__iexact=name, parent__isnull=True)
+
+    def subcategory(self, name, parent):
+        return Category.objects.get(name__iexact=name, parent_id=parent.id)
+
+
+class CategoryIndex(CategoryLookup):
+
+    '''Looks up categories by case-insensitive name from an in-memory (name, parent) index of the category tree'''
+
+    def __init__(self):
+        self.index = defaultdict(list)
+        for category in Category.objects.select_related('parent'):
+            self.index[(category.name.lower(), category.parent_id)].append(category)
+
+    def get(self, name, parent_id):
+        matches = self.index.get((name.lower(), parent_id), [])
+        if not matches:
+            raise Category.DoesNotExist("Category matching query does not exist.")
+        if len(matches) > 1:
+            raise Category.MultipleObjectsReturned("Returned more than one Category")
+        return matches[0]
+
+    def top_level(self, name):
+        return self.get(name, None)
+
+    def subcategory(self, name, parent):
+        return self.get(name, parent.id)
+
 
 class Command(BaseCommand):
     help = 'Imports datasets from a particularly formatted CSV'
@@ -25,70 +192,279 @@ class Command(BaseCommand):
                             dest='dryrun',
                             default=False,
                             help='Run through file and output errors, but don\'t save datasets')
+        parser.add_argument('-b', '--bulk',
+                            action='store_true',
+                            dest='bulk',
+                            default=False,
+                            help='Validate and insert datasets in batches instead of one at a time')
+        parser.add_argument('-s', '--sync',
+                            action='store_true',
+                            dest='sync',
+                            default=False,
+                            help='Insert, update and delete datasets so the database matches the CSV, \
+                            matching rows to datasets by title, group name and url')
+        parser.add_argument('--chunk-size',
+                            type=int,
+                            dest='chunk_size',
+                            default=1000,
+                            help='Number of rows to validate and insert per batch in bulk and sync modes')
 
-    def handle(self, *args, **options):
-        # Define some helper functions for fixing fields
-
-        def remap_keys(iterable, mapping):
-            '''Some fields need manual remapping to Dataset field names'''
-            for key, value in iterable:
-                if key in mapping and value:
-                    key = mapping[key]
-                yield key, value
-
-        def fields_to_lists(iterable, fields):
-            for key, value in iterable:
-                if key in fields:
-                    value = [v.strip() for v in value.split(",") if v.strip() != '']
-                yield key, value
-
-        def standardize_key(k):
-            '''Many fields can be fixed by lowercasing and replacing certain characters'''
-            return str(k).lower().strip().replace('? (y/n)', '').replace(' ', '_').replace('/', '_')
-
-        def reformat_keys(iterable, func):
-            '''Iterate over keys and run standardize_key'''
-            for key, value in iterable:
-                new_key = func(key)
-                if value:
-                    yield new_key, value
-
-        def booleanize(iterable, fields):
-            for key, value in iterable:
-                if value and key in fields:
-                    value = True if value.lower().startswith('y') else False
-                yield key, value
-
-        def clean_url(url):
-                url = url.strip()
+    def report_item(self, item, verbosity):
+        item_title = item.get('title', None)
+        item_url = item.get('url', None)
+        item_group_name = item.get('group_name', None)
+
+        if verbosity > 0:
+            if item_title:
+                self.stdout.write("Title: '{}'".format(item_title))
+            else:
+                self.stderr.write("Title not provided for '{}'".format(item_url))
+        if verbosity > 0:
+            if item_group_name:
+                self.stdout.write("Group: '{}'".format(item_group_name))
+            else:
+                self.stderr.write("Group name not provided")
+        if item_url and verbosity > 1:
+            self.stdout.write("\tURL: '{}'".format(item.get('url')))
+
+    def report_incomplete(self, item, verbosity):
+        self.stderr.write("\tNot enough data to create a dataset! Need at least a title and group_name")
+        if verbosity > 2:
+            item_info = "\n\t".join(["{}: {}".format(k, str(v)) for k, v in item.items()])
+            self.stderr.write(item_info)
+
+    def report_invalid(self, item, error, verbosity):
+        self.stderr.write("Failed to save dataset '{}':\n\t{}".format(item.get('title', None), str(error)))
+        if verbosity > 2:
+            self.stderr.write("\n".join(["{}: {}".format(k, str(v)) for k, v in item.items()]))
+
+    def find_categories(self, category_tuples, lookup, verbosity):
+        '''Handle categories and subcategories'''
+        categories = []
+        for cat_name, subcat_name in category_tuples:
+            cat_repr = "{} -> {}".format(cat_name, subcat_name)
+            if cat_name:
                 try:
-                    validate_url(url)
-                    return url
-                except ValidationError:
-                    return None
-
-        def clean_states(states_list):
-            values_set = (v.strip() for v in states_list)
-            values_set = ('US' if v.startswith('Nat') else v for v in values_set)
-            values_set = (v for v in values_set if v in STATE_NATL_LOOKUP.keys())
-            return list(values_set)
-
-        def make_categories(cat_entry, subcat_entry):
-            category_entries = cat_entry.split(',') if cat_entry else []
-            cat_entries_cleaned = (c.strip() for c in category_entries)
-            subcategory_entries = subcat_entry.split(',') if subcat_entry else []
-            subcat_entries_cleaned = (c.strip() for c in subcategory_entries)
-            cat_zip = zip_longest(cat_entries_cleaned, subcat_entries_cleaned, fillvalue=None)
-            return cat_zip
-
-        def titlecase(s):
-            return re.sub(r"[A-Za-z]+('[A-Za-z]+)?",
-                          lambda mo: mo.group(0)[0].upper() + mo.group(0)[1:].lower(),
-                          s)
-
-        def clean_sectors(sectors_list):
-            return list(titlecase(s.strip()) for s in sectors_list)
+                    top_cat = lookup.top_level(cat_name.strip())
+                except Category.DoesNotExist:
+                    self.stderr.write("\tNo top-level category '{}' for {}".format(cat_name, cat_repr))
+                    continue
+                if subcat_name:
+                    try:
+                        cat_obj = lookup.subcategory(subcat_name.strip(), top_cat)
+                        categories.append(cat_obj)
+                        if verbosity > 1:
+                            self.stdout.write("\tFound '{}' category".format(cat_repr))
+                    except Category.MultipleObjectsReturned:
+                        self.stderr.write("\tMultiple category matches for {}".format(cat_repr))
+                    except Category.DoesNotExist:
+                        self.stderr.write("\tNo '{}' category".format(cat_repr))
+                else:
+                    categories.append(top_cat)
+            else:
+                self.stderr.write("\t No top-level category name for {}!".format(cat_repr))
+        return categories
 
+    def import_rows(self, rows, save_objects, verbosity):
+        '''Create datasets one row at a time'''
+        lookup = CategoryLookup()
+        for row in rows:
+            item, category_tuples = normalize_row(row)
+            self.report_item(item, verbosity)
+            categories = self.find_categories(category_tuples, lookup, verbosity)
+            # If we don't have a title and a group_name,we probably shouldn't create an entry.
+            if item.get('title', None) and item.get('group_name', None):
+                dataset = None
+                if save_objects:
+                    with transaction.atomic():
+                        dataset = Dataset.objects.create(**item)
+                        for cat_obj in categories:
+                            if verbosity > 2:
+                                self.stdout.write("Adding dataset to category '{}'".format(cat_obj.path))
+                            dataset.categories.add(cat_obj)
+                        try:
+                            dataset.full_clean()
+                            dataset.save()
+                        except ValidationError as e:
+                            self.report_invalid(item, e, verbosity)
+                else:
+                    if verbosity > 0:
+                        self.stdout.write("Would create dataset: '{}'\n\n".format(item.get('title', '')))
+                if dataset:
+                    if verbosity > 0:
+                        self.stdout.write("\tCreated Dataset: {}\n".format(dataset))
+            else:
+                self.report_incomplete(item, verbosity)
+
+    def bulk_import_rows(self, rows, save_objects, verbosity, chunk_size):
+        '''Validate datasets in chunks and insert each valid chunk with a few bulk queries'''
+        lookup = CategoryIndex()
+        for chunk in chunked(rows, chunk_size):
+            pending = []
+            for row in chunk:
+                item, category_tuples = normalize_row(row)
+                self.report_item(item, verbosity)
+                categories = self.find_categories(category_tuples, lookup, verbosity)
+                if item.get('title', None) and item.get('group_name', None):
+                    dataset = Dataset(**item)
+                    try:
+                        dataset.full_clean()
+                    except ValidationError as e:
+                        self.report_invalid(item, e, verbosity)
+                        continue
+                    if save_objects:
+                        pending.append((dataset, categories))
+                    elif verbosity > 0:
+                        self.stdout.write("Would create dataset: '{}'\n\n".format(item.get('title', '')))
+                else:
+                    self.report_incomplete(item, verbosity)
+
+            if pending:
+                self.bulk_create_datasets(pending, verbosity)
+
+    def changed_fields(self, dataset, incoming, categories):
+        '''Names of fields (and 'categories') that differ between an existing dataset and a cleaned, unsaved one'''
+        changes = [f.name for f in Dataset._meta.concrete_fields
+                   if f.name not in SYNC_EXCLUDED_FIELDS and f.value_from_object(dataset) != f.value_from_object(incoming)]
+        if set(c.id for c in categories) != set(c.id for c in dataset.categories.all()):
+            changes.append('categories')
+        return changes
+
+    def sync_rows(self, rows, save_objects, verbosity, chunk_size):
+        '''
+        Make the datasets in the database match the rows: create new datasets, update changed ones
+        and delete the ones missing from the rows. Unchanged datasets aren't saved, so their updated_at
+        stays put and an update_index run with an age only reindexes what changed. Nothing is deleted if
+        any row was incomplete or invalid, since its dataset may be one that looks missing. Datasets that
+        share a title, group name and url in the database are reported, not deleted.
+        '''
+        lookup = CategoryIndex()
+        existing = {}
+        duplicates = []
+        for dataset in Dataset.objects.prefetch_related('categories'):
+            key = dataset_fingerprint(dataset.title, dataset.group_name, dataset.url)
+            if key in existing:
+                duplicates.append(dataset)
+            else:
+                existing[key] = dataset
+
+        seen = set()
+        pending = []
+        counts = Counter()
+        for row in rows:
+            item, category_tuples = normalize_row(row)
+            self.report_item(item, verbosity)
+            categories = self.find_categories(category_tuples, lookup, verbosity)
+            key = dataset_fingerprint(item.get('title', None), item.get('group_name', None), item.get('url', None))
+            duplicate_row = key in seen
+            # Before validating, so the existing dataset for a rejected row isn't taken for a stale one
+            seen.add(key)
+            if not (item.get('title', None) and item.get('group_name', None)):
+                self.report_incomplete(item, verbosity)
+                counts['rejected'] += 1
+                continue
+            incoming = Dataset(**item)
+            try:
+                incoming.full_clean()
+            except ValidationError as e:
+                self.report_invalid(item, e, verbosity)
+                counts['rejected'] += 1
+                continue
+
+            if duplicate_row:
+                self.stderr.write("\tDuplicate row for dataset '{}', skipping".format(incoming.title))
+                continue
+
+            dataset = existing.get(key, None)
+            if dataset is None:
+                counts['created'] += 1
+                if save_objects:
+                    pending.append((incoming, categories))
+                    if len(pending) >= chunk_size:
+                        self.bulk_create_datasets(pending, verbosity)
+                        pending = []
+                elif verbosity > 0:
+                    self.stdout.write("Would create dataset: '{}'\n\n".format(incoming.title))
+                continue
+
+            changes = self.changed_fields(dataset, incoming, categories)
+            if not changes:
+                counts['unchanged'] += 1
+                continue
+            counts['updated'] += 1
+            if verbosity > 0:
+                self.stdout.write("\t{} Dataset: {} ({})".format("Updating" if save_objects else "Would update",
+                                                                  dataset, ", ".join(changes)))
+            if save_objects:
+                with transaction.atomic():
+                    for name in changes:
+                        if name != 'categories':
+                            setattr(dataset, name, getattr(incoming, name))
+                    dataset.save()
+                    if 'categories' in changes:
+                        dataset.categories.clear()
+                        dataset.categories.add(*categories)
+
+        if pending:
+            self.bulk_create_datasets(pending, verbosity)
+
+        for dataset in duplicates:
+            self.stderr.write("\tDataset {} has the same title, group name and url as another dataset, "
+                              "not syncing it: {}".format(dataset.id, dataset))
+        stale = [dataset for key, dataset in existing.items() if key not in seen]
+        if stale and counts['rejected']:
+            self.stderr.write("Not deleting {} datasets missing from the rows, since {} rows were rejected".format(
+                len(stale), counts['rejected']))
+            stale = []
+        counts['deleted'] = len(stale)
+        if verbosity > 0:
+            for dataset in stale:
+                self.stdout.write("\t{} Dataset: {}".format("Deleting" if save_objects else "Would delete", dataset))
+        if save_objects and stale:
+            Dataset.objects.filter(id__in=[dataset.id for dataset in stale]).delete()
+            self.remove_from_search_indexes(stale)
+
+        self.stdout.write("Created {}, updated {}, deleted {}, unchanged {} datasets".format(
+            counts['created'], counts['updated'], counts['deleted'], counts['unchanged']))
+
+    def remove_from_search_indexes(self, datasets):
+        '''update_index with an age doesn't notice deleted rows, so remove them from the search indexes here'''
+        for using in haystack_connections.connections_info:
+            try:
+                index = haystack_connections[using].get_unified_index().get_index(Dataset)
+            except NotHandled:
+                continue
+            for dataset in datasets:
+                try:
+                    index.remove_object(dataset, using=using)
+                except Exception as e:
+                    self.stderr.write("Failed to remove dataset '{}' from the '{}' search index:\n\t{}".format(
+                        dataset.title, using, str(e)))
+
+    def bulk_create_datasets(self, pending, verbosity):
+        DatasetCategory = Dataset.categories.through
+        with transaction.atomic():
+            dataset_ids = reserve_ids(Dataset, len(pending))
+            category_links = []
+            for (dataset, categories), dataset_id in zip(pending, dataset_ids):
+                dataset.pk = dataset_id
+                category_ids = set()
+                for cat_obj in categories:
+                    if cat_obj.id not in category_ids:
+                        if verbosity > 2:
+                            self.stdout.write("Adding dataset to category '{}'".format(cat_obj.path))
+                        category_ids.add(cat_obj.id)
+                        category_links.append(DatasetCategory(dataset_id=dataset_id, category_id=cat_obj.id))
+            Dataset.objects.bulk_create([dataset for dataset, categories in pending])
+            DatasetCategory.objects.bulk_create(category_links)
+        # bulk_create doesn't send post_save, so cached list pages and the search index are updated here
+        bump_catalog_version()
+        queue_search_update(Dataset, *dataset_ids)
+        if verbosity > 0:
+            for dataset, categories in pending:
+                self.stdout.write("\tCreated Dataset: {}\n".format(dataset))
+
+    def handle(self, *args, **options):
         fp = options.get('filepath', None)
         save_objects = not options.get('dryrun', False)
         verbosity = options.get('verbosity', None)
@@ -96,110 +472,11 @@ class Command(BaseCommand):
         # Actual script exection
         if fp:
             reader = DictReader(fp)
-            data_rows = [r for r in reader]
-            for row in data_rows:
-                # Reformat keys (make lowercase)
-                data_iterable = reformat_keys(row.items(), standardize_key)
-                # Remap keys to model fields
-                mapping = {
-                    standardize_key("Private/Government"): "sectors",
-                    standardize_key("Is this data updated? (Y/N)"): "updated",
-                    # "category": "categories",
-                    "internet_availability": "internet_available",
-                    "tag": "tags",
-                    "state": "states",
-                    "format": "formats",
-                    "sublocation": "division_names",
-                    "location": "resource_location"
-                }
-                data_iterable = remap_keys(data_iterable, mapping)
-                # Make list fields from strings
-                list_fields = ("tags", "formats", "sectors", "states", "division_names")
-                data_iterable = fields_to_lists(data_iterable, list_fields)
-                # Coerce select values to booleans
-                boolean_fields = ("mappable", "updated", "population_data", "internet_available")
-                data_iterable = booleanize(data_iterable, boolean_fields)
-                # Back to a dict, clean states, sectors and url
-                item = dict(data_iterable)
-                item['states'] = clean_states(item.get('states', []))
-                item['sectors'] = clean_sectors(item.get('sectors', []))
-                raw_url = item.pop('url', None)
-                if raw_url:
-                    item['url'] = clean_url(raw_url)
-
-                # Get category paths
-                category_raw = item.pop('category', None)
-                subcategory_raw = item.pop('subcategory', None)
-                category_tuples = make_categories(category_raw, subcategory_raw)
-
-                #  Get title, url, etc.
-                item_title = item.get('title', None)
-                item_url = item.get('url', None)
-                item_group_name = item.get('group_name', None)
-
-                if verbosity > 0:
-                    if item_title:
-                        self.stdout.write("Title: '{}'".format(item_title))
-                    else:
-                        self.stderr.write("Title not provided for '{}'".format(item_url))
-                if verbosity > 0:
-                    if item_group_name:
-                        self.stdout.write("Group: '{}'".format(item_group_name))
-                    else:
-                        self.stderr.write("Group name not provided")
-                if item_url and verbosity > 1:
-                    self.stdout.write("\tURL: '{}'".format(item.get('url')))
-                # Handle categories and subcategories
-                categories = []
-                for cat_name, subcat_name in category_tuples:
-                    cat_repr = "{} -> {}".format(cat_name, subcat_name)
-                    if cat_name:
-                        try:
-                            top_cat = Category.objects.get(name__iexact=cat_name.strip(), parent__isnull=True)
-                        except Category.DoesNotExist:
-                            self.stderr.write("\tNo top-level category '{}' for {}".format(cat_name, cat_repr))
-                            continue
-                        if subcat_name:
-                            try:
-                                cat_obj = Category.objects.get(name__iexact=subcat_name.strip(), parent_id=top_cat.id)
-                                categories.append(cat_obj)
-                                if verbosity > 1:
-                                    self.stdout.write("\tFound '{}' category".format(cat_repr))
-                            except Category.MultipleObjectsReturned:
-                                self.stderr.write("\tMultiple category matches for {}".format(cat_repr))
-                            except Category.DoesNotExist:
-                                self.stderr.write("\tNo '{}' category".format(cat_repr))
-                        else:
-                            categories.append(top_cat)
-                    else:
-                        self.stderr.write("\t No top-level category name for {}!".format(cat_repr))
-                # If we don't have a title and a group_name,we probably shouldn't create an entry.
-                if item_title and item_group_name:
-                    dataset = None
-                    if save_objects:
-                        with transaction.atomic():
-                            dataset = Dataset.objects.create(**item)
-                            for cat_obj in categories:
-                                if verbosity > 2:
-                                    self.stdout.write("Adding dataset to category '{}'".format(cat_obj.path))
-                                dataset.categories.add(cat_obj)
-                            try:
-                                dataset.full_clean()
-                                dataset.save()
-                            except ValidationError as e:
-                                self.stderr.write("Failed to save dataset '{}':\n\t{}".format(item_title, str(e)))
-                                if verbosity > 2:
-                                    self.stderr.write("\n".join(["{}: {}".format(k, str(v)) for k, v in item.items()]))
-                    else:
-                        if verbosity > 0:
-                            self.stdout.write("Would create dataset: '{}'\n\n".format(item.get('title', '')))
-                    if dataset:
-                        if verbosity > 0:
-                            self.stdout.write("\tCreated Dataset: {}\n".format(dataset))
-                else:
-                    self.stderr.write("\tNot enough data to create a dataset! Need at least a title and group_name")
-                    if verbosity > 2:
-                        item_info = "\n\t".join(["{}: {}".format(k, str(v)) for k, v in item.items()])
-                        self.stderr.write(item_info)
+            if options.get('sync', False):
+                self.sync_rows(reader, save_objects, verbosity, max(options.get('chunk_size', 1000), 1))
+            elif options.get('bulk', False):
+                self.bulk_import_rows(reader, save_objects, verbosity, max(options.get('chunk_size', 1000), 1))
+            else:
+                self.import_rows(reader, save_objects, verbosity)
         else:
             self.stderr.write("File path not provided. Please provide a path to a CSV file to process")
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.contrib.postgres.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cjdata', '0004_auto_20150916_1409'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedDatasets',
+            fields=[
+                ('dataset', models.OneToOneField(primary_key=True, serialize=False, related_name='related_datasets', to='cjdata.Dataset')),
+                ('related_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=[], size=None)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Related Datasets',
+                'verbose_name_plural': 'Related Datasets',
+            },
+        ),
+        # For finding the lists that include changed datasets (related_ids && ARRAY[...])
+        migrations.RunSQL('CREATE INDEX cjdata_relateddatasets_related_ids ON cjdata_relateddatasets USING GIN(related_ids);',
+                          reverse_sql='DROP INDEX cjdata_relateddatasets_related_ids;'),
+    ]
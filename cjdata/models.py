@@ -32,18 +32,27 @@ class Category(TimestampedModel):
     def slugged_path(self):
         return self._calculate_pathname(True)
 
+    def _get_parent(self):
+        """Get the parent from the category tree cache, so it doesn't need a query"""
+        if self.parent_id is None:
+            return None
+        from cjdata.categories import category_tree
+        return category_tree().get(self.parent_id) or self.parent
+
     def _calculate_pathname(self, slugged):
         name = self.slug if slugged else self.name
+        parent = self._get_parent()
 
-        if self.parent:
-            parent_name = str(self.parent.slug) if slugged else str(self.parent.name)
+        if parent:
+            parent_name = str(parent.slug) if slugged else str(parent.name)
             return "{parent_name}/{name}".format(name=name, parent_name=parent_name)
         else:
             return "{name}".format(name=name)
 
     def get_absolute_url(self):
-        kwargs = {'category': self.parent.slug if self.parent else self.slug}
-        if self.parent:
+        parent = self._get_parent()
+        kwargs = {'category': parent.slug if parent else self.slug}
+        if parent:
             kwargs['subcategory'] = self.slug
         return reverse('datasets-by-category', kwargs=kwargs)
 
@@ -117,3 +126,22 @@ class Dataset(TimestampedModel):
         return "{states} ({sectors}): {title}".format(states=self.get_states_display(),
                                                       title=self.title,
                                                       sectors=",".join(self.sectors))
+
+
+class RelatedDatasets(models.Model):
+
+    """
+    The ids of the Datasets most like a Dataset, best first, as found by an Elasticsearch
+    more_like_this query. Computed in the background by cjdata.related.store_related_datasets.
+    """
+
+    dataset = models.OneToOneField('Dataset', primary_key=True, related_name='related_datasets')
+    related_ids = ArrayField(models.IntegerField(), default=[])
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Related Datasets"
+        verbose_name_plural = "Related Datasets"
+
+    def __str__(self):
+        return 'Datasets like {}'.format(self.dataset_id)
@@ -0,0 +1,51 @@
+from django.conf import settings
+from haystack.query import SearchQuerySet
+from cjdata.models import Dataset, RelatedDatasets
+
+
+def related_count():
+    return getattr(settings, 'RELATED_DATASETS_COUNT', 20)
+
+
+def live_related_ids(dataset, count=None):
+    '''
+    The ids of the count Datasets most like dataset, from a more_like_this query limited to Datasets,
+    without the facets of search.query.sqs
+    '''
+    results = SearchQuerySet().models(Dataset).more_like_this(dataset)[:count or related_count()]
+    return [int(result.pk) for result in results if int(result.pk) != dataset.pk]
+
+
+def store_related_datasets(dataset_ids, count=None):
+    '''
+    Recompute and save the RelatedDatasets of the given datasets, returning how many were saved.
+    Each row is upserted on its own, since page views and overlapping tasks may be saving the same rows.
+    '''
+    datasets = list(Dataset.objects.filter(pk__in=dataset_ids).only('id'))
+    for dataset in datasets:
+        RelatedDatasets.objects.update_or_create(dataset_id=dataset.pk,
+                                                 defaults={'related_ids': live_related_ids(dataset, count)})
+    return len(datasets)
+
+
+def datasets_to_refresh(dataset_ids):
+    '''The given dataset ids plus the ids of datasets whose stored related datasets include any of them'''
+    dataset_ids = set(dataset_ids)
+    related = RelatedDatasets.objects.filter(related_ids__overlap=list(dataset_ids))
+    return sorted(dataset_ids.union(related.values_list('dataset_id', flat=True)))
+
+
+def related_datasets(dataset, count=None):
+    '''
+    The Datasets most like dataset, best first, with their categories prefetched. They're read from
+    its RelatedDatasets, or found with a live query (and stored) if they haven't been computed yet.
+    Datasets deleted since they were computed are left out.
+    '''
+    count = count or related_count()
+    related_ids = RelatedDatasets.objects.filter(dataset_id=dataset.pk).values_list('related_ids', flat=True).first()
+    if related_ids is None:
+        related_ids = live_related_ids(dataset, count)
+        RelatedDatasets.objects.update_or_create(dataset_id=dataset.pk, defaults={'related_ids': related_ids})
+    related_ids = related_ids[:count]
+    datasets = Dataset.objects.prefetch_related('categories').in_bulk(related_ids)
+    return [datasets[pk] for pk in related_ids if pk in datasets]
@@ -0,0 +1,153 @@
+from django.conf import settings
+from django.http import HttpRequest
+from django.utils import timezone
+from cjdata.categories import category_tree
+from cjdata.models import Dataset, STATE_NATL_CHOICES
+from common.utils import generate_csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+
+MANIFEST_NAME = 'manifest.json'
+# The view kwargs that name each kind of snapshot, in order
+SNAPSHOT_KWARGS = {
+    'all': (),
+    'category': ('category', 'subcategory'),
+    'location': ('location',),
+}
+
+_manifest_lock = threading.Lock()
+_manifest = None
+_manifest_mtime = None
+
+
+def snapshot_root():
+    return getattr(settings, 'EXPORT_SNAPSHOT_ROOT', os.path.join(settings.BASE_DIR, 'exports'))
+
+
+def snapshot_name(kind, **kwargs):
+    '''
+    The name of the snapshot of an export view, like "category/courts/appeals" or "location/nc".
+    Category slugs are kept as they are, since the category tree matches them exactly. The location is
+    lowercased, since StateDatasetsView takes a state abbreviation in any case.
+    '''
+    parts = [kind]
+    for key in SNAPSHOT_KWARGS[kind]:
+        value = kwargs.get(key, None)
+        if value:
+            parts.append(value.lower() if key == 'location' else value)
+    return '/'.join(parts)
+
+
+def snapshot_exports():
+    '''(kind, export view class, view kwargs) for each snapshot: the full catalog, each category and each state'''
+    from cjdata.views import CategoryDatasetsExportView, DatasetsExportView, StatesExportView
+
+    exports = [('all', DatasetsExportView, {})]
+    exports.append(('category', CategoryDatasetsExportView, {'category': 'none'}))
+    tree = category_tree()
+    for root in tree.roots:
+        exports.append(('category', CategoryDatasetsExportView, {'category': root.slug}))
+        for child in root.children:
+            exports.append(('category', CategoryDatasetsExportView, {'category': root.slug, 'subcategory': child.slug}))
+    for abbr, name in STATE_NATL_CHOICES:
+        if Dataset.objects.filter(states__contains=[abbr]).exists():
+            exports.append(('location', StatesExportView, {'location': abbr.lower()}))
+    return exports
+
+
+def export_rows(view_class, kwargs):
+    '''The fieldnames and queryset that an export view streams for a request without filters'''
+    view = view_class()
+    view.request = HttpRequest()
+    view.request.method = 'GET'
+    view.args = ()
+    view.kwargs = kwargs
+    return view.get_export_fieldnames(), view.get_queryset()
+
+
+def write_snapshot(path, fieldnames, queryset):
+    '''
+    Write a queryset as gzip-compressed CSV to a temporary file next to path, then move it into place,
+    so path is either missing or complete. Returns the number of rows, the size and a SHA-1 of the file.
+    '''
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    rows = -1
+    with open(tmp_path, 'wb') as raw:
+        # mtime=0 keeps the gzip header, and so the ETag, the same for the same rows
+        with gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0) as compressed:
+            with io.TextIOWrapper(compressed, encoding='utf-8', newline='') as text:
+                for line in generate_csv(queryset, fieldnames):
+                    text.write(line)
+                    rows += 1
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return rows, os.path.getsize(path), digest.hexdigest()
+
+
+def write_manifest(root, manifest):
+    tmp_path = os.path.join(root, MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(root, MANIFEST_NAME))
+
+
+def export_snapshots(keep=2):
+    '''
+    Write every export snapshot into a new version directory under EXPORT_SNAPSHOT_ROOT, then switch the
+    manifest to it in one atomic rename. Only the latest keep versions are kept, so downloads of the
+    previous version can finish. Returns the manifest.
+    '''
+    root = snapshot_root()
+    version = timezone.now().strftime('%Y%m%d%H%M%S')
+    snapshots = {}
+    for kind, view_class, kwargs in snapshot_exports():
+        name = snapshot_name(kind, **kwargs)
+        relative_path = os.path.join(version, name + '.csv.gz')
+        fieldnames, queryset = export_rows(view_class, kwargs)
+        rows, size, sha1 = write_snapshot(os.path.join(root, relative_path), fieldnames, queryset)
+        snapshots[name] = {'path': relative_path, 'rows': rows, 'size': size, 'etag': '"{}"'.format(sha1)}
+
+    manifest = {'version': version, 'created_at': timezone.now().isoformat(), 'snapshots': snapshots}
+    write_manifest(root, manifest)
+
+    versions = sorted(entry for entry in os.listdir(root) if os.path.isdir(os.path.join(root, entry)))
+    for old_version in versions[:-keep] if keep else versions:
+        if old_version != version:
+            shutil.rmtree(os.path.join(root, old_version), ignore_errors=True)
+    return manifest
+
+
+def find_snapshot(name):
+    '''
+    The manifest entry for a snapshot, with the absolute path of its file, or None if there isn't one.
+    The manifest is reread when its file changes.
+    '''
+    global _manifest, _manifest_mtime
+    manifest_path = os.path.join(snapshot_root(), MANIFEST_NAME)
+    try:
+        mtime = os.stat(manifest_path).st_mtime
+    except OSError:
+        return None
+    with _manifest_lock:
+        if _manifest is None or mtime != _manifest_mtime:
+            with open(manifest_path) as f:
+                _manifest = json.load(f)
+            _manifest_mtime = mtime
+        snapshot = _manifest['snapshots'].get(name, None)
+    if snapshot is None:
+        return None
+    return dict(snapshot, file_path=os.path.join(snapshot_root(), snapshot['path']))
@@ -1,68 +1,110 @@
-from haystack.management.commands import (update_index, rebuild_index)
-from celery import shared_task, group
-from crawler.tasks import inspect_url
+from haystack.management.commands import update_index
+from celery import chord, group, shared_task
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from cjdata.related import datasets_to_refresh, store_related_datasets
+from cjdata.snapshots import export_snapshots
+from common.utils import chunked
+from crawler.tasks import schedule_inspections
 from crawler.models import Crawl
 from cjdata.models import Dataset
+from search.cache import bump_index_generation
+from search.rebuild import index_pk_range, plan_rebuild, swap_alias
 
 
 @shared_task
 def update_search_index(age=24):
-    return update_index.Command().handle(using=['default'], age=age)
+    result = update_index.Command().handle(using=['default'], age=age)
+    bump_index_generation()
+    update_related_datasets.delay()
+    return result
 
 
 @shared_task
-def rebuild_search_index(age=None):
-    return rebuild_index.Command().handle(using=['default'], age=None, interactive=False)
+def rebuild_search_index(age=None, using='default', chunk_size=1000):
+    '''
+    Rebuild a search index without downtime: index_search_range tasks fill a new versioned index in
+    parallel, then finish_search_rebuild moves the index name (an alias) to it
+    '''
+    started_at = timezone.now()
+    index_name, jobs = plan_rebuild(using, chunk_size=chunk_size)
+    rebuild = chord([index_search_range.si(*job) for job in jobs],
+                    finish_search_rebuild.si(using, index_name, started_at.isoformat()))
+    return rebuild()
+
+
+@shared_task
+def index_search_range(using, label, index_name, first_pk, last_pk):
+    return index_pk_range(using, label, index_name, first_pk, last_pk)
+
+
+@shared_task
+def finish_search_rebuild(using, index_name, started_at=None):
+    since = parse_datetime(started_at) if started_at else None
+    old_indexes = swap_alias(using, index_name, since=since)
+    bump_index_generation()
+    update_related_datasets.delay()
+    return old_indexes
+
+
+@shared_task
+def update_related_datasets(dataset_ids=None, chunk_size=200):
+    '''
+    Recompute the stored related datasets of every Dataset, or of dataset_ids and the datasets
+    that list any of them, in store_related_datasets_chunk tasks of chunk_size datasets
+    '''
+    if dataset_ids is None:
+        dataset_ids = Dataset.objects.order_by('pk').values_list('pk', flat=True).iterator()
+    else:
+        dataset_ids = datasets_to_refresh(dataset_ids)
+    g = group([store_related_datasets_chunk.si(chunk) for chunk in chunked(dataset_ids, chunk_size)])
+    return g()
+
+
+@shared_task
+def store_related_datasets_chunk(dataset_ids):
+    return store_related_datasets(dataset_ids)
+
+
+@shared_task
+def export_dataset_snapshots():
+    manifest = export_snapshots()
+    return manifest['version']
+
+
+def dataset_job(dataset_id, url):
+    return {
+        'url': url,
+        'related_object': {'app_label': 'cjdata', 'model': 'dataset', 'id': dataset_id},
+    }
+
+
+def dataset_urls():
+    '''(id, url) for every Dataset that has a url (imports store a missing or invalid url as NULL)'''
+    return Dataset.objects.exclude(url__isnull=True).exclude(url='').values_list('id', 'url')
 
 
 @shared_task
 def inspect_all_dataset_urls():
-    tasks = []
-    qs = Dataset.objects.all()
     crawl = Crawl.objects.create()
-    for obj in qs:
-        obj_info = {
-            'app_label': 'cjdata',
-            'model': 'dataset',
-            'id': obj.id,
-            'crawl_id': crawl.id
-        }
-        task = inspect_url.subtask((obj.url,),
-                                   {'related_object': obj_info},
-                                   countdown=2)
-        tasks.append(task)
-    g = group(tasks)
+    jobs = [dataset_job(*dataset) for dataset in dataset_urls().iterator()]
+    g = schedule_inspections(jobs, crawl_id=crawl.id)
     return g()
 
 
 @shared_task
 def inspect_previously_bad_urls(previous_crawl_id):
-    tasks = []
     try:
         previous_crawl = Crawl.objects.get(id=previous_crawl_id)
     except Crawl.DoesNotExist:
         previous_crawl = None
     if previous_crawl:
         # Get URLInspections from previous_crawl that has exists=False
-        qs = previous_crawl.urlinspection_set.filter(exists=False)
+        qs = previous_crawl.urlinspection_set.filter(exists=False, related__isnull=False)
         note_text = "Closer inspection of 'bad' urls from previous crawl with id {}".format(previous_crawl_id)
         crawl = Crawl.objects.create(notes=note_text, related_crawl_id=previous_crawl_id)
-        for obj in qs:
-            obj_info = {
-                'app_label': 'cjdata',
-                'model': 'dataset',
-                'id': obj.id,
-                'crawl_id': crawl.id
-            }
-            task = inspect_url.subtask((obj.url,),
-                                       {
-                                        'method': 'GET',
-                                        'related_object': obj_info,
-                                        'stream': True
-                                        },
-                                       countdown=2)
-            tasks.append(task)
-        g = group(tasks)
+        jobs = [dataset_job(*inspection) for inspection in qs.values_list('related__object_id', 'url').iterator()]
+        g = schedule_inspections(jobs, crawl_id=crawl.id, method='GET', stream=True)
         return g()
     else:
         return None
@@ -1,3 +1,40 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+from cjdata.models import Dataset
+from cjdata.snapshots import find_snapshot, snapshot_name, write_manifest
+from cjdata.tasks import dataset_urls
+import shutil
+import tempfile
 
-# Create your tests here.
+
+class DatasetURLsTests(TestCase):
+
+    def test_datasets_without_urls_are_skipped(self):
+        # bulk_create, so no search index updates are queued
+        Dataset.objects.bulk_create([
+            Dataset(title='Linked', group_name='Group', url='http://example.gov/data'),
+            Dataset(title='No url', group_name='Group', url=None),
+            Dataset(title='Blank url', group_name='Group', url=''),
+        ])
+        self.assertEqual([url for pk, url in dataset_urls()], ['http://example.gov/data'])
+
+
+class SnapshotNameTests(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_category_names_keep_their_case(self):
+        # The category tree matches slugs exactly, so "Courts" and "courts" are different categories
+        name = snapshot_name('category', category='Courts', subcategory='Appeals')
+        self.assertEqual(name, 'category/Courts/Appeals')
+        snapshot = {'path': '1/category/Courts/Appeals.csv.gz', 'rows': 1, 'size': 1, 'etag': '"1"'}
+        write_manifest(self.root, {'version': '1', 'snapshots': {name: snapshot}})
+        with override_settings(EXPORT_SNAPSHOT_ROOT=self.root):
+            self.assertEqual(find_snapshot(snapshot_name('category', category='Courts', subcategory='Appeals'))['path'],
+                             snapshot['path'])
+            self.assertIsNone(find_snapshot(snapshot_name('category', category='courts', subcategory='appeals')))
+
+    def test_location_names_ignore_case(self):
+        # StateDatasetsView uppercases the location
+        self.assertEqual(snapshot_name('location', location='NC'), snapshot_name('location', location='nc'))
@@ -3,7 +3,8 @@ from haystack.views import search_view_factory
 
 from search.query import sqs
 from search.forms import PliableFacetedSearchForm
-from search.views import (BetterFacetedSearchView, AutocompleteView, AnalyzerView, SearchExportView)
+from search.views import (BetterFacetedSearchView, AutocompleteView, AnalyzerView, SearchExportView,
+                          SearchStatsView)
 from cjdata.views import (IndexView, DatasetDetailView, CategoryDatasetsView,
                           StateDatasetsView, DatasetsExportView, CategoryDatasetsExportView,
                           StatesExportView)
@@ -26,6 +27,7 @@ urlpatterns = patterns(
                                           searchqueryset=sqs), name='haystack_search'),
     url(r'search/export/$', SearchExportView.as_view(), name='search_export'),
     url(r'^search/analyze/', AnalyzerView.as_view(), name='search_analyze'),
+    url(r'^search/stats/$', SearchStatsView.as_view(), name='search_stats'),
     url(r'^autocomplete/$', AutocompleteView.as_view(), name='haystack_autocomplete'),
     url(r'^$', IndexView.as_view(), name='index')
 )
@@ -1,11 +1,15 @@
 from django.views.generic import View, DetailView, ListView, TemplateView
-from django.shortcuts import get_object_or_404
-from cjdata.models import Dataset, Category, STATE_NATL_LOOKUP
-from search.query import sqs
+from django.core.cache import cache
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from cjdata.cache import datasets_table_key, list_page_cache_key, list_page_timeout
+from cjdata.categories import category_tree
+from cjdata.models import Dataset, STATE_NATL_LOOKUP
+from cjdata.related import related_datasets
+from cjdata.facets import facet_counts
+from cjdata.snapshots import find_snapshot, snapshot_name
+from common.utils import parse_byte_range
 from common.views import CSVExportMixin
 from django.db.models import Q
-import itertools
-from collections import Counter
 
 
 class IndexView(TemplateView):
@@ -19,12 +23,28 @@ class DatasetDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super(DatasetDetailView, self).get_context_data(**kwargs)
-        context['more_like_this'] = sqs.more_like_this(self.object)[:100]
+        context['related_datasets'] = related_datasets(self.object)
         return context
 
 
 class DatasetsView(ListView):
 
+    """
+    Base view for the category and location list pages. Rendered pages are cached by path, selected facets
+    and page, and the datasets table by the datasets it shows, all keyed on the catalog version.
+    """
+
+    def get(self, request, *args, **kwargs):
+        cache_key = list_page_cache_key(request)
+        if cache_key is None:
+            return super().get(request, *args, **kwargs)
+        content = cache.get(cache_key)
+        if content is not None:
+            return HttpResponse(content)
+        response = super().get(request, *args, **kwargs)
+        response.add_post_render_callback(lambda r: cache.set(cache_key, r.content, list_page_timeout()))
+        return response
+
     def complete_query(self, query):
         # filter query based on selected_facets GET parameters
         if self.request.GET.getlist('selected_facets', False):
@@ -43,13 +63,14 @@ class DatasetsView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # counter number of each states, sectors, group_name, and access_type
-        obj_list = self.object_list
-        context['states'] = Counter([val for sublist in [x.states for x in obj_list] for val in sublist]).items()
-        context['sectors'] = Counter([val for sublist in [x.sectors for x in obj_list] for val in sublist]).items()
-        context['group_name'] = Counter([x.group_name for x in obj_list]).items()
-        context['access_type'] = Counter([x.access_type for x in obj_list]).items()
+        # count number of each states, sectors, group_name, and access_type in the database
+        context.update(facet_counts(self.object_list))
         context['selected_facets'] = self.selected_facets
+        # Just the ids, so the datasets and their categories are only loaded when the table isn't cached
+        page_obj = context.get('page_obj', None)
+        if page_obj is not None:
+            context['datasets_table_key'] = datasets_table_key(page_obj.object_list.values_list('pk', flat=True))
+        context['datasets_table_timeout'] = list_page_timeout()
 
         return context
 
@@ -63,12 +84,13 @@ class CategoryDatasetsView(DatasetsView):
         cat_slug = self.kwargs.get('category', None)
         subcat_slug = self.kwargs.get('subcategory', None)
         if cat_slug != 'none':
-            self.category = get_object_or_404(Category, slug=cat_slug, parent__isnull=True)
-            if subcat_slug:
-                self.category = get_object_or_404(Category, slug=subcat_slug, parent=self.category)
-                query = Q(categories=self.category)
-            else:
-                query = (Q(categories=self.category) | Q(categories__parent=self.category))
+            tree = category_tree()
+            self.category = tree.find(cat_slug)
+            if self.category and subcat_slug:
+                self.category = tree.find(subcat_slug, parent_id=self.category.id)
+            if self.category is None:
+                raise Http404("No category found matching the query")
+            query = Q(categories__in=[self.category.id] + self.category.descendant_ids)
         else:
             query = Q(categories__isnull=True)
 
@@ -96,18 +118,74 @@ class StateDatasetsView(DatasetsView):
         return context
 
 
-class StatesExportView(CSVExportMixin, StateDatasetsView):
+def read_file_range(path, first, last, chunk_size=64 * 1024):
+    with open(path, 'rb') as f:
+        f.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def snapshot_response(request, snapshot):
+    '''
+    A response with a snapshot's gzip-compressed CSV as a gzip-encoded text/csv download, answering
+    If-None-Match with a 304 and a single-range Range header (unless If-Range names another version) with a 206
+    '''
+    etag = snapshot['etag']
+    if etag in [tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        byte_range = None
+        if request.META.get('HTTP_IF_RANGE', etag) == etag:
+            byte_range = parse_byte_range(request.META.get('HTTP_RANGE', None), snapshot['size'])
+        if byte_range is None:
+            response = FileResponse(open(snapshot['file_path'], 'rb'), content_type='text/csv')
+            response['Content-Length'] = snapshot['size']
+        else:
+            first, last = byte_range
+            response = StreamingHttpResponse(read_file_range(snapshot['file_path'], first, last),
+                                             content_type='text/csv', status=206)
+            response['Content-Range'] = 'bytes {}-{}/{}'.format(first, last, snapshot['size'])
+            response['Content-Length'] = last - first + 1
+        response['Content-Encoding'] = 'gzip'
+        response['Content-Disposition'] = 'attachment; filename="criminal-justice-{}-rows.csv"'.format(snapshot['rows'])
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+class SnapshotExportMixin(object):
+
+    """
+    Serves an export from its pre-generated snapshot (see cjdata.snapshots) when the request has no filters,
+    there is a snapshot and the client accepts gzip. Otherwise the export is streamed live.
+    """
+
+    snapshot_kind = None
+
+    def get(self, request, *args, **kwargs):
+        if not request.GET and 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            snapshot = find_snapshot(snapshot_name(self.snapshot_kind, **kwargs))
+            if snapshot is not None:
+                return snapshot_response(request, snapshot)
+        return super().get(request, *args, **kwargs)
+
+
+class StatesExportView(SnapshotExportMixin, CSVExportMixin, StateDatasetsView):
     paginate_by = None
+    snapshot_kind = 'location'
 
 
-class DatasetsExportView(CSVExportMixin, View):
+class DatasetsExportView(SnapshotExportMixin, CSVExportMixin, View):
     model = Dataset
-
-    def get_queryset(self):
-        queryset = super(DatasetsExportView, self).get_queryset()
-        queryset = queryset.prefetch_related('categories')
-        return queryset
+    snapshot_kind = 'all'
 
 
-class CategoryDatasetsExportView(CSVExportMixin, CategoryDatasetsView):
+class CategoryDatasetsExportView(SnapshotExportMixin, CSVExportMixin, CategoryDatasetsView):
     paginate_by = None
+    snapshot_kind = 'category'
@@ -0,0 +1,151 @@
+from django.db.backends.postgresql_psycopg2.base import DatabaseWrapper as PostgresDatabaseWrapper
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+import psycopg2 as Database
+import os
+import threading
+import time
+
+_lock = threading.Lock()
+_pools = {}
+_pid = None
+
+
+class ConnectionPool(object):
+
+    """
+    Up to max_size PostgreSQL connections shared by the threads (or eventlet green threads) of a
+    process. checkout() reuses an idle connection or opens a new one, waiting up to timeout seconds
+    when all of them are in use. A connection idle for health_check_interval seconds or more is
+    checked with a SELECT 1 before it's reused, and replaced if that fails.
+    """
+
+    def __init__(self, max_size=10, timeout=30, health_check_interval=30):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        # Under eventlet's monkey patching this is a green semaphore, so waiting blocks one green thread
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self.opened = 0
+        self.reused = 0
+        self.discarded = 0
+        self.isolation_level = None
+
+    def is_healthy(self, conn):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            return True
+        except Database.Error:
+            return False
+
+    def discard(self, conn):
+        with self._lock:
+            self.discarded += 1
+        try:
+            conn.close()
+        except Database.Error:
+            pass
+
+    def checkout(self, connect):
+        '''An idle healthy connection, or a new one from connect()'''
+        if not self._slots.acquire(timeout=self.timeout):
+            raise Database.OperationalError(
+                'No database connection available within {} seconds (pool size {})'.format(self.timeout, self.max_size))
+        try:
+            while True:
+                with self._lock:
+                    conn, returned_at = self._idle.pop() if self._idle else (None, None)
+                if conn is None:
+                    break
+                if conn.closed:
+                    self.discard(conn)
+                elif time.time() - returned_at >= self.health_check_interval and not self.is_healthy(conn):
+                    self.discard(conn)
+                else:
+                    with self._lock:
+                        self.reused += 1
+                    return conn
+            conn = connect()
+            with self._lock:
+                self.opened += 1
+            return conn
+        except:
+            self._slots.release()
+            raise
+
+    def release(self):
+        '''Give up the slot of a checked-out connection that was discarded rather than checked in'''
+        self._slots.release()
+
+    def checkin(self, conn):
+        '''Roll back anything left open on a connection and keep it for reuse, or close it if it's broken'''
+        try:
+            reusable = not conn.closed
+            if reusable and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+                reusable = conn.get_transaction_status() == TRANSACTION_STATUS_IDLE
+        except Database.Error:
+            reusable = False
+        if reusable:
+            with self._lock:
+                self._idle.append((conn, time.time()))
+        else:
+            self.discard(conn)
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {'max_size': self.max_size, 'idle': len(self._idle), 'opened': self.opened,
+                    'reused': self.reused, 'discarded': self.discarded}
+
+
+def get_pool(alias, settings_dict):
+    '''The ConnectionPool for a database alias in this process (a forked process starts with new pools)'''
+    global _pid
+    with _lock:
+        if _pid != os.getpid():
+            _pools.clear()
+            _pid = os.getpid()
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(max_size=settings_dict.get('POOL_SIZE', 10),
+                                           timeout=settings_dict.get('POOL_TIMEOUT', 30),
+                                           health_check_interval=settings_dict.get('POOL_HEALTH_CHECK_INTERVAL', 30))
+        return _pools[alias]
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+
+    """
+    The PostgreSQL backend with connections from a ConnectionPool (sized by the database's POOL_SIZE,
+    POOL_TIMEOUT and POOL_HEALTH_CHECK_INTERVAL settings). Closing a connection returns it to the pool,
+    so CONN_MAX_AGE should be 0 and each request or celery task gives its connection back when done.
+    """
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        parent = super(DatabaseWrapper, self)
+        connection = self.pool.checkout(lambda: parent.get_new_connection(conn_params))
+        # Only a new connection sets the isolation level Django uses outside autocommit; reused ones share it
+        if getattr(self, 'isolation_level', None) is not None:
+            self.pool.isolation_level = self.isolation_level
+        else:
+            self.isolation_level = self.pool.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        if self.in_atomic_block:
+            # close() keeps self.connection (marked closed_in_transaction) inside an atomic block, so the
+            # connection mustn't go back to the pool, where another thread could take it: close it for good
+            self.pool.discard(self.connection)
+            self.pool.release()
+        else:
+            self.pool.checkin(self.connection)
@@ -1,12 +1,17 @@
 import csv
 import itertools
 import re
+import threading
 from django.utils.encoding import smart_text
 from django.core.exceptions import FieldDoesNotExist
+from django.db import connection
+from django.db.models.query import QuerySet
 
 
 MARKDOWN_LIST_ITEM_REG = r'^(?P<indent>\s*)[\-+*]\s(?P<item>.*)$'
 
+_after_transaction = threading.local()
+
 
 class Echo(object):
 
@@ -17,33 +22,169 @@ class Echo(object):
         return value
 
 
-def generate_rows(queryset, fieldnames):
-    def values_for_fields(object, fieldnames):
-        concrete_model = object._meta.concrete_model
+def chunked(iterable, size):
+    '''Yield lists of up to size items from iterable'''
+    iterator = iter(iterable)
+    return iter(lambda: list(itertools.islice(iterator, size)), [])
+
+
+def repeat_after_transaction(func):
+    '''
+    If the default connection is in a transaction, call func again once this thread's request or
+    celery task has finished (see run_after_transaction), when the transaction has been committed.
+    Meant for cache invalidations: between an invalidation and the commit, another process can cache
+    the old data again. Django 1.8 has no on_commit.
+    '''
+    if connection.in_atomic_block:
+        funcs = getattr(_after_transaction, 'funcs', None)
+        if funcs is None:
+            funcs = _after_transaction.funcs = []
+        if func not in funcs:
+            funcs.append(func)
+
+
+def run_after_transaction(**kwargs):
+    '''Call the functions deferred by repeat_after_transaction in this thread. Connected to request_finished and task_postrun.'''
+    funcs = getattr(_after_transaction, 'funcs', None) or []
+    _after_transaction.funcs = []
+    for func in funcs:
+        func()
+
+
+def reserve_ids(model, count):
+    '''Take count ids from a model's primary key sequence, since bulk_create won't return them'''
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+                       [model._meta.db_table, model._meta.pk.column, count])
+        return [row[0] for row in cursor.fetchall()]
+
+
+class FieldValues(object):
+
+    """A bare object to set field values on, so Field.value_to_string can read them back."""
+
+
+class RowSerializer(object):
+
+    """
+    Turns model objects, or querysets of them, into lists of strings for CSV rows.
+
+    Fields are looked up once per serializer rather than once per row. Many-to-many fields are output
+    as a comma-separated list of the related objects, whose labels are loaded in a single query.
+    """
+
+    def __init__(self, model, fieldnames):
+        self.model = model._meta.concrete_model
+        self.fields = []
         for name in fieldnames:
             try:
-                field = concrete_model._meta.get_field(name)
-                if field.rel and field.rel.many_to_many:
-                    manager = getattr(object, field.name)
-                    yield ", ".join(smart_text(related) for related in manager.all())
-                else:
-                    yield field.value_to_string(object)
+                self.fields.append(self.model._meta.get_field(name))
             except FieldDoesNotExist:
                 pass
+        self.value_fields = [f for f in self.fields if not (f.rel and f.rel.many_to_many)]
+        self.m2m_fields = [f for f in self.fields if f.rel and f.rel.many_to_many]
+        self._labels = {}
+
+    def related_labels(self, field):
+        '''Map related object pks to (position, label), with positions in the related model's default ordering'''
+        if field.name not in self._labels:
+            related_model = field.rel.to
+            fk_names = [f.name for f in related_model._meta.concrete_fields if f.rel]
+            related = related_model._default_manager.select_related(*fk_names)
+            self._labels[field.name] = dict((obj.pk, (position, smart_text(obj)))
+                                            for position, obj in enumerate(related))
+        return self._labels[field.name]
+
+    def join_related(self, field, related_ids):
+        labels = self.related_labels(field)
+        return ", ".join(label for position, label in sorted(labels[pk] for pk in related_ids if pk in labels))
 
-    for object in queryset:
-        yield list(value for value in values_for_fields(object, fieldnames))
+    def related_ids(self, queryset, field):
+        '''Map each object pk in queryset to a list of related pks for a many-to-many field, in one query'''
+        through = field.rel.through
+        source_name = field.m2m_field_name()
+        target_name = field.m2m_reverse_field_name()
+        pairs = (through._default_manager
+                        .filter(**{source_name + '__in': queryset.values('pk')})
+                        .values_list(source_name, target_name))
+        related = {}
+        for source_id, target_id in pairs.iterator():
+            related.setdefault(source_id, []).append(target_id)
+        return related
+
+    def object_row(self, obj):
+        row = []
+        for field in self.fields:
+            if field in self.m2m_fields:
+                # Uses prefetched objects if the caller prefetched the relation
+                related_ids = (related.pk for related in getattr(obj, field.name).all())
+                row.append(self.join_related(field, related_ids))
+            else:
+                row.append(field.value_to_string(obj))
+        return row
+
+    def queryset_rows(self, queryset):
+        related = dict((field.name, self.related_ids(queryset, field)) for field in self.m2m_fields)
+        attnames = [f.attname for f in self.value_fields]
+        values = queryset.prefetch_related(None).values_list('pk', *attnames)
+        field_values = FieldValues()
+        for pk_and_values in values.iterator():
+            pk = pk_and_values[0]
+            field_values.__dict__.update(zip(attnames, pk_and_values[1:]))
+            row = []
+            for field in self.fields:
+                if field in self.m2m_fields:
+                    row.append(self.join_related(field, related[field.name].get(pk, ())))
+                else:
+                    row.append(field.value_to_string(field_values))
+            yield row
 
 
-def generate_csv(queryset, fieldnames):
+def export_fieldnames(model):
+    '''A model's forward fields and many-to-many fields for a CSV export, without the id or reverse relations'''
+    return [f.name for f in model._meta.concrete_model._meta.get_fields() if not f.auto_created and f.name != 'id']
+
+
+def generate_rows(queryset, fieldnames, model=None):
+    '''
+    Generate a list of field values for each object in queryset. A QuerySet is read as tuples of values;
+    any other iterable of objects (which requires model) is read an object at a time.
+    '''
+    serializer = RowSerializer(model or queryset.model, fieldnames)
+    if isinstance(queryset, QuerySet):
+        return serializer.queryset_rows(queryset)
+    return (serializer.object_row(obj) for obj in queryset)
+
+
+def generate_csv(queryset, fieldnames, model=None):
         pseudo_buffer = Echo()
         writer = csv.writer(pseudo_buffer)
 
-        rows = generate_rows(queryset, fieldnames)
+        rows = generate_rows(queryset, fieldnames, model=model)
         return itertools.chain((writer.writerow(header) for header in (fieldnames,)),
                                (writer.writerow(row) for row in rows))
 
 
+def parse_byte_range(header, size):
+    '''
+    The (first, last) byte positions, inclusive, of a single-range "Range: bytes=..." header for a
+    resource of size bytes. None if the header is missing, malformed, has several ranges or can't be
+    satisfied, in which case the whole resource should be sent.
+    '''
+    match = re.match(r'^bytes=(\d*)-(\d*)$', (header or '').strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # A suffix range: the last n bytes
+        first, last = max(size - int(last), 0), size - 1
+    else:
+        first, last = int(first), min(int(last), size - 1) if last else size - 1
+    if first > last or first >= size:
+        return None
+    return first, last
+
+
 def parse_markdown_list(input_string):
     '''Simple markdown list parser that supports single-line list items only.'''
     list_item = re.compile(MARKDOWN_LIST_ITEM_REG)
@@ -1,13 +1,15 @@
 from django.views.generic.list import MultipleObjectMixin
 from django.http import StreamingHttpResponse
-from common.utils import generate_csv
+from common.utils import export_fieldnames, generate_csv
 
 
 class CSVExportMixin(MultipleObjectMixin):
     """Mixin for exporting data as CSV using GET requests"""
+    def get_export_fieldnames(self):
+        return export_fieldnames(self.model)
+
     def get(self, request, *args, **kwargs):
-        concrete_model = self.model._meta.concrete_model
-        output_fieldnames = [f.name for f in concrete_model._meta.get_fields() if f.name != 'id']
+        output_fieldnames = self.get_export_fieldnames()
         qs = self.get_queryset()
 
         csv_data = generate_csv(qs, output_fieldnames)
@@ -0,0 +1,228 @@
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit, urlunsplit
+import requests
+import threading
+import time
+
+DEFAULT_TIMEOUT = (9.05, 12.05)
+
+
+def generate_url_info(url, response):
+    '''Generate some information about a url and a response'''
+    return {
+        'url': url,
+        'status_code': response.status_code,
+        'is_redirect': response.is_redirect,
+        'is_permanent_redirect': response.is_permanent_redirect,
+        'url_history': [h.url for h in response.history],
+        'final_url': response.url,
+        'headers': dict(response.headers),
+        'method': response.request.method if response.request else None,
+        'seconds_elapsed': response.elapsed.total_seconds() if response.elapsed else None
+    }
+
+
+def generate_error_info(url, method, error):
+    '''Generate information about a url that couldn't be requested, shaped like generate_url_info's'''
+    return {
+        'url': url,
+        'status_code': None,
+        'is_redirect': False,
+        'is_permanent_redirect': False,
+        'url_history': [],
+        'final_url': url,
+        'headers': {},
+        'method': method,
+        'seconds_elapsed': None,
+        'error': '{}: {}'.format(error.__class__.__name__, error),
+    }
+
+
+def response_validators(headers):
+    '''The ETag and Last-Modified values from a dict of response headers, keyed by lowercased header name'''
+    validators = {}
+    for key, value in headers.items():
+        if key.lower() in ('etag', 'last-modified') and value:
+            validators[key.lower()] = value
+    return validators
+
+
+def conditional_headers(validators):
+    '''Request headers that ask the server for a 304 if the resource still matches validators'''
+    headers = {}
+    if validators.get('etag', None):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last-modified', None):
+        headers['If-Modified-Since'] = validators['last-modified']
+    return headers
+
+
+def normalize_url(url):
+    '''Strip whitespace, lowercase the scheme and host, and drop default ports and fragments'''
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    for default_scheme, default_port in (('http', ':80'), ('https', ':443')):
+        if scheme == default_scheme and netloc.endswith(default_port):
+            netloc = netloc[:-len(default_port)]
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+def url_host(url):
+    return urlsplit(url).netloc.lower()
+
+
+def dedupe_jobs(jobs):
+    '''
+    Merge jobs whose urls are the same once normalized into one job for the normalized url,
+    with the 'related_objects' of all of them
+    '''
+    merged = OrderedDict()
+    for job in jobs:
+        url = normalize_url(job['url'])
+        if url not in merged:
+            merged[url] = {'url': url, 'related_objects': []}
+        related_objects = job.get('related_objects', None) or []
+        if job.get('related_object', None):
+            related_objects = related_objects + [job['related_object']]
+        merged[url]['related_objects'].extend(related_objects)
+    return list(merged.values())
+
+
+def host_batches(jobs, batch_size):
+    '''
+    Split jobs into lists of batches, where every job for a host is in the same list of batches.
+    Hosts with more than batch_size urls get a list of batch_size batches to run one after another, so
+    per-host limits hold for the whole crawl; smaller hosts are packed together into single batches.
+    '''
+    by_host = OrderedDict()
+    for job in jobs:
+        by_host.setdefault(url_host(job['url']), []).append(job)
+
+    sequences = []
+    batch = []
+    for host, host_jobs in sorted(by_host.items(), key=lambda item: -len(item[1])):
+        if len(host_jobs) > batch_size:
+            sequences.append([host_jobs[i:i + batch_size] for i in range(0, len(host_jobs), batch_size)])
+            continue
+        if len(batch) + len(host_jobs) > batch_size:
+            sequences.append([batch])
+            batch = []
+        batch.extend(host_jobs)
+    if batch:
+        sequences.append([batch])
+    return sequences
+
+
+class HostQueue(object):
+
+    """
+    The pending requests for one host, with the host's session and the time its next request may start.
+    Each host gets its own session so connections (and TLS sessions) are reused from request to request.
+    """
+
+    def __init__(self, host, max_connections):
+        self.host = host
+        self.pending = deque()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.lock = threading.Lock()
+        self.next_request_at = 0
+
+    def next_job(self, delay):
+        '''Pop the next pending job, and wait until the host's politeness delay has passed'''
+        with self.lock:
+            if not self.pending:
+                return None
+            job = self.pending.popleft()
+            now = time.monotonic()
+            wait = self.next_request_at - now
+            self.next_request_at = max(now, self.next_request_at) + delay
+        if wait > 0:
+            time.sleep(wait)
+        return job
+
+
+class CrawlEngine(object):
+
+    """
+    Requests a batch of URLs concurrently from a thread pool.
+
+    Requests are grouped by host: at most per_host_concurrency requests to one host run at a time,
+    and requests to one host start at least per_host_delay seconds apart. Requests to different
+    hosts run in parallel, up to concurrency at once.
+
+    Each job is a dict with at least a 'url'. A job's 'validators' (see response_validators) make its
+    request conditional, so an unchanged resource is answered with a bodiless 304. inspect() returns
+    (job, info) pairs, where info is generate_url_info() for the response, plus the response's 'validators'
+    and whether it was 'not_modified', or generate_error_info() if the request failed.
+    """
+
+    def __init__(self, concurrency=20, per_host_concurrency=2, per_host_delay=0.5,
+                 method='HEAD', stream=False, amt=16, timeout=DEFAULT_TIMEOUT, verify_ssl=False):
+        self.concurrency = concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_delay = per_host_delay
+        self.method = method
+        self.stream = stream
+        self.amt = amt
+        self.timeout = timeout
+        self.verify_ssl = verify_ssl
+
+    def request(self, session, job):
+        url = job['url']
+        sent_validators = job.get('validators', None) or {}
+        try:
+            response = session.request(self.method, url, stream=self.stream, timeout=self.timeout,
+                                       verify=self.verify_ssl, allow_redirects=True,
+                                       headers=conditional_headers(sent_validators))
+            try:
+                if self.stream:
+                    content = response.raw.read(amt=self.amt)
+                info = generate_url_info(url, response)
+                info['not_modified'] = response.status_code == 304
+                # A 304 need not repeat every validator, so keep the ones that were sent
+                validators = dict(sent_validators) if info['not_modified'] else {}
+                validators.update(response_validators(response.headers))
+                info['validators'] = validators
+                if self.stream:
+                    info['streamed_response'] = True
+                    info['has_content'] = True if content else False
+            finally:
+                response.close()
+        except (requests.RequestException, ValueError) as e:
+            info = generate_error_info(url, self.method, e)
+        return info
+
+    def work_host(self, queue, results):
+        job = queue.next_job(self.per_host_delay)
+        while job is not None:
+            results.append((job, self.request(queue.session, job)))
+            job = queue.next_job(self.per_host_delay)
+
+    def inspect(self, jobs):
+        queues = OrderedDict()
+        for job in jobs:
+            host = url_host(job['url'])
+            if host not in queues:
+                queues[host] = HostQueue(host, self.per_host_concurrency)
+            queues[host].pending.append(job)
+
+        # deque.append is thread-safe, so workers can share the results
+        results = deque()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                futures = []
+                for queue in queues.values():
+                    for i in range(min(self.per_host_concurrency, len(queue.pending))):
+                        futures.append(executor.submit(self.work_host, queue, results))
+                for future in futures:
+                    future.result()
+        finally:
+            for queue in queues.values():
+                queue.session.close()
+        return list(results)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from crawler.models import Crawl
+from crawler.reports import CRAWL_CHANGES, CRAWL_DIFF_FIELDNAMES, stream_crawl_diff
+import csv
+
+
+class Command(BaseCommand):
+    help = "Report urls that broke, were fixed or are still broken between two crawls"
+
+    def add_arguments(self, parser):
+        parser.add_argument('old_crawl_id', type=int)
+        parser.add_argument('new_crawl_id', type=int)
+        parser.add_argument('--change', action='append', choices=CRAWL_CHANGES, dest='changes',
+                            help='Only report this kind of change (can be repeated)')
+        parser.add_argument('--output_file', default=None, dest='output_file')
+
+    def handle(self, *args, **options):
+        for crawl_id in (options['old_crawl_id'], options['new_crawl_id']):
+            if not Crawl.objects.filter(id=crawl_id).exists():
+                raise CommandError('Crawl "{}" does not exist'.format(crawl_id))
+
+        output = stream_crawl_diff(options['old_crawl_id'], options['new_crawl_id'], changes=options.get('changes'))
+
+        if options.get('output_file') is not None:
+            out_dest = open(options.get('output_file'), 'w')
+        else:
+            out_dest = self.stdout
+
+        writer = csv.DictWriter(out_dest, CRAWL_DIFF_FIELDNAMES, quoting=csv.QUOTE_ALL, extrasaction='ignore')
+        writer.writeheader()
+
+        for item in output:
+            writer.writerow(item)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from crawler.models import Crawl
+from crawler.reports import record_url_health
+
+
+class Command(BaseCommand):
+    help = "Record URL health changes from crawls (by default every crawl, oldest first, to build the history)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('crawl_ids', nargs='*', type=int)
+
+    def handle(self, *args, **options):
+        crawls = Crawl.objects.order_by('created_at')
+        if options.get('crawl_ids'):
+            crawls = crawls.filter(id__in=options['crawl_ids'])
+        verbosity = int(options.get('verbosity', 1))
+        for crawl_id in crawls.values_list('id', flat=True):
+            num_changes = record_url_health(crawl_id)
+            if verbosity > 0:
+                self.stdout.write("Crawl {}: {} changes".format(crawl_id, num_changes))
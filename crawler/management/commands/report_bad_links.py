@@ -1,43 +1,48 @@
 from django.core.management.base import BaseCommand, CommandError
 from crawler.models import Crawl
+from crawler.reports import BAD_LINK_FIELDNAMES, stream_bad_links
 import csv
 
 
+def status_range(value):
+    '''Parse a status code ("404") or range ("400-499") into a (min, max) tuple'''
+    try:
+        low, sep, high = value.partition('-')
+        return int(low), int(high) if sep else int(low)
+    except ValueError:
+        raise CommandError('Invalid status or status range "{}"'.format(value))
+
+
 class Command(BaseCommand):
     help = "Report 'bad' urls (HTTP status 400+) for a given crawl"
 
     def add_arguments(self, parser):
         parser.add_argument('crawl_id', nargs=1, type=int)
         parser.add_argument('--output_file', default=None, dest='output_file')#Dec 1, 2015 - added the ability to export the bad links to a file
+        parser.add_argument('--status', default=None, dest='status',
+                            help='Only report this status code or range of codes, like 404 or 500-599')
+        parser.add_argument('--host', default=None, dest='host',
+                            help='Only report urls on this host (or its subdomains)')
+        parser.add_argument('--content-type', default=None, dest='content_type',
+                            help='Only report responses whose Content-Type starts with this, like text/html')
 
     def handle(self, *args, **options):
         crawl_id = options['crawl_id'][0]
-        try:
-            crawl = Crawl.objects.get(id=crawl_id)
-        except Crawl.DoesNotExist:
+        if not Crawl.objects.filter(id=crawl_id).exists():
             raise CommandError('Crawl "{}" does not exist'.format(crawl_id))
 
-        qs = crawl.urlinspection_set.filter(exists=False).order_by('url')
-
-        def inspection_dict(i):
-            return {
-                'url': i.url,
-                'status_code': i.response_meta.get('status_code', None),
-                'server': i.response_meta['headers'].get('server', None),
-                'content_type': i.response_meta['headers'].get('content-type', None),
-                'is_redirect': i.response_meta.get('is_redirect', None),
-                'seconds_elapsed': i.response_meta.get('seconds_elapsed', None),
-            }
+        filters = {'host': options.get('host'), 'content_type': options.get('content_type')}
+        if options.get('status'):
+            filters['min_status'], filters['max_status'] = status_range(options['status'])
 
-        fieldnames = ('url', 'status_code', 'server', 'content_type', 'is_redirect', 'seconds_elapsed')
-        output = (inspection_dict(x) for x in qs)
+        output = stream_bad_links(crawl_id, **filters)
 
         if options.get('output_file') is not None: #checks to see if the optional argument is provided
             out_dest = open(options.get('output_file'), 'w') #if the option is provided we write to a file
         else:
             out_dest = self.stdout #else we write to a standard out (console)
 
-        writer = csv.DictWriter(out_dest, fieldnames, quoting=csv.QUOTE_ALL, extrasaction='ignore')
+        writer = csv.DictWriter(out_dest, BAD_LINK_FIELDNAMES, quoting=csv.QUOTE_ALL, extrasaction='ignore')
         writer.writeheader()
 
         for item in output:
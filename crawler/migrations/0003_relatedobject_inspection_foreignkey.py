@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crawler', '0002_auto_20150528_1551'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='relatedobject',
+            name='inspection',
+            field=models.ForeignKey(related_name='related', to='crawler.URLInspection'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crawler', '0003_relatedobject_inspection_foreignkey'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='urlinspection',
+            index_together=set([('crawl', 'exists')]),
+        ),
+        migrations.RunSQL("CREATE INDEX crawler_urlinspection_crawl_status_code ON crawler_urlinspection "
+                          "(crawl_id, ((response_meta::json->>'status_code')::integer));",
+                          reverse_sql='DROP INDEX crawler_urlinspection_crawl_status_code;'),
+    ]
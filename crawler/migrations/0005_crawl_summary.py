@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import postgres.fields
+import decimal
+import django.core.serializers.json
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crawler', '0004_report_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='crawl',
+            name='finished_at',
+            field=models.DateTimeField(null=True, blank=True, help_text='Datetime when the last inspection of the crawl was saved'),
+        ),
+        migrations.AddField(
+            model_name='crawl',
+            name='summary',
+            field=postgres.fields.JSONField(default={}, blank=True, help_text='Inspection counts and timings, stored when the crawl finishes', decode_kwargs={'parse_float': decimal.Decimal}, encode_kwargs={'cls': django.core.serializers.json.DjangoJSONEncoder}),
+        ),
+        migrations.AlterIndexTogether(
+            name='urlinspection',
+            index_together=set([('crawl', 'exists'), ('crawl', 'url', 'id')]),
+        ),
+    ]
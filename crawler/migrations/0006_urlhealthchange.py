@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crawler', '0005_crawl_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='URLHealthChange',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', auto_created=True, primary_key=True, serialize=False)),
+                ('url', models.URLField(max_length=500)),
+                ('exists', models.BooleanField(help_text='URL resource exists as of this change')),
+                ('status_code', models.PositiveSmallIntegerField(null=True, blank=True)),
+                ('changed_at', models.DateTimeField(help_text='Datetime of the inspection that saw the change')),
+                ('crawl', models.ForeignKey(null=True, blank=True, on_delete=django.db.models.deletion.SET_NULL, to='crawler.Crawl')),
+            ],
+            options={
+                'get_latest_by': 'changed_at',
+                'verbose_name': 'URL Health Change',
+                'verbose_name_plural': 'URL Health Changes',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='urlhealthchange',
+            index_together=set([('url', 'changed_at')]),
+        ),
+    ]
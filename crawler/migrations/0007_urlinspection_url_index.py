@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crawler', '0006_urlhealthchange'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='urlinspection',
+            index_together=set([('crawl', 'exists'), ('crawl', 'url', 'id'), ('url', 'created_at')]),
+        ),
+    ]
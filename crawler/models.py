@@ -9,6 +9,10 @@ from django.contrib.contenttypes.models import ContentType
 class Crawl(TimestampedModel):
     notes = models.TextField(blank=True)
     related_crawl = models.ForeignKey('self', blank=True, null=True)
+    finished_at = models.DateTimeField(null=True, blank=True,
+                                       help_text='Datetime when the last inspection of the crawl was saved')
+    summary = JSONField(default={}, blank=True,
+                        help_text='Inspection counts and timings, stored when the crawl finishes')
 
     class Meta:
         get_latest_by = 'created_at'
@@ -32,6 +36,7 @@ class URLInspection(TimestampedModel):
 
     class Meta:
         get_latest_by = 'created_at'
+        index_together = [('crawl', 'exists'), ('crawl', 'url', 'id'), ('url', 'created_at')]
         verbose_name = "URL Inspection"
         verbose_name_plural = "URL Inspections"
 
@@ -43,7 +48,7 @@ class URLInspection(TimestampedModel):
 
 
 class RelatedObject(models.Model):
-    inspection = models.OneToOneField('URLInspection', related_name='related')
+    inspection = models.ForeignKey('URLInspection', related_name='related')
     content_type = models.ForeignKey(ContentType)
     object_id = models.PositiveIntegerField()
     object = GenericForeignKey('content_type', 'object_id')
@@ -54,5 +59,27 @@ class RelatedObject(models.Model):
         verbose_name_plural = "Related Objects"
 
     def __str__(self):
-        return 'URLInspection[{}] → {}'.format(self.inspection.id, self.object)
+        return 'URLInspection[{}] → {}'.format(self.inspection_id, self.object)
 
+
+class URLHealthChange(models.Model):
+
+    """
+    A change in whether a URL works, recorded at the end of the crawl that first saw it.
+    Only changes are kept, so a URL's history is a handful of rows however often it's crawled.
+    """
+
+    url = models.URLField(max_length=500)
+    crawl = models.ForeignKey('Crawl', blank=True, null=True, on_delete=models.SET_NULL)
+    exists = models.BooleanField(help_text='URL resource exists as of this change')
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    changed_at = models.DateTimeField(help_text='Datetime of the inspection that saw the change')
+
+    class Meta:
+        get_latest_by = 'changed_at'
+        index_together = [('url', 'changed_at')]
+        verbose_name = "URL Health Change"
+        verbose_name_plural = "URL Health Changes"
+
+    def __str__(self):
+        return "'{}' {} at {}".format(self.url, 'works' if self.exists else 'broke', self.changed_at)
@@ -0,0 +1,195 @@
+from django.db import connection, transaction
+from crawler.models import (URLInspection, URLHealthChange)
+
+# Matches the status code index in crawler/migrations/0004_report_indexes.py
+STATUS_CODE_SQL = "((response_meta::json->>'status_code')::integer)"
+HOST_SQL = "lower(split_part(url, '/', 3))"
+
+BAD_LINK_FIELDNAMES = ('url', 'status_code', 'server', 'content_type', 'is_redirect', 'seconds_elapsed')
+
+
+def header_sql(name):
+    '''SQL for a response header's value, matching the header name case-insensitively'''
+    return ("(SELECT h.value FROM json_each_text(response_meta::json->'headers') AS h "
+            "WHERE lower(h.key) = '{}' LIMIT 1)".format(name))
+
+
+def bad_links_query(crawl_id, min_status=None, max_status=None, host=None, content_type=None):
+    '''
+    SQL and params for the bad links (exists=False) of a crawl, ordered by url, with the report fields
+    pulled out of response_meta. host matches the url's host or its subdomains, and content_type
+    matches the start of the Content-Type header.
+    '''
+    where = ['crawl_id = %s', '"exists" = false']
+    params = [crawl_id]
+    if min_status is not None:
+        where.append('{} >= %s'.format(STATUS_CODE_SQL))
+        params.append(min_status)
+    if max_status is not None:
+        where.append('{} <= %s'.format(STATUS_CODE_SQL))
+        params.append(max_status)
+    if host:
+        where.append("({0} = %s OR {0} LIKE %s)".format(HOST_SQL))
+        params.extend([host.lower(), '%.' + host.lower()])
+    if content_type:
+        where.append("{} ILIKE %s".format(header_sql('content-type')))
+        params.append(content_type.replace('%', r'\%').replace('_', r'\_') + '%')
+
+    sql = '''
+        SELECT url,
+               {status_code} AS status_code,
+               {server} AS server,
+               {content_type} AS content_type,
+               (response_meta::json->>'is_redirect')::boolean AS is_redirect,
+               response_meta::json->>'seconds_elapsed' AS seconds_elapsed
+        FROM {table}
+        WHERE {where}
+        ORDER BY url
+    '''.format(status_code=STATUS_CODE_SQL,
+               server=header_sql('server'),
+               content_type=header_sql('content-type'),
+               table=connection.ops.quote_name(URLInspection._meta.db_table),
+               where=' AND '.join(where))
+    return sql, params
+
+
+def stream_query(name, sql, params, fieldnames, itersize=2000):
+    '''Yield a dict of fieldnames for each row of a query, read through a server-side cursor, itersize rows at a time'''
+    with transaction.atomic():
+        connection.ensure_connection()
+        cursor = connection.connection.cursor(name=name)
+        cursor.itersize = itersize
+        try:
+            cursor.execute(sql, params)
+            for row in cursor:
+                yield dict(zip(fieldnames, row))
+        finally:
+            cursor.close()
+
+
+def stream_bad_links(crawl_id, itersize=2000, **filters):
+    '''Yield a dict of BAD_LINK_FIELDNAMES for each bad link of a crawl (see bad_links_query)'''
+    sql, params = bad_links_query(crawl_id, **filters)
+    return stream_query('bad_links_{}'.format(crawl_id), sql, params, BAD_LINK_FIELDNAMES, itersize=itersize)
+
+
+def crawl_summary(crawl_id):
+    '''
+    Counts of a crawl's inspections by status class ('2xx', '3xx', etc., or 'error' when there's no
+    status), by exists, and the mean and percentiles of seconds_elapsed
+    '''
+    table = connection.ops.quote_name(URLInspection._meta.db_table)
+    summary = {'total': 0, 'status_classes': {}, 'exists': 0, 'bad': 0}
+    with connection.cursor() as cursor:
+        cursor.execute('''
+            SELECT {status_code} / 100, "exists", COUNT(*)
+            FROM {table}
+            WHERE crawl_id = %s
+            GROUP BY 1, 2
+        '''.format(status_code=STATUS_CODE_SQL, table=table), [crawl_id])
+        for status_class, exists, count in cursor.fetchall():
+            key = '{}xx'.format(status_class) if status_class is not None else 'error'
+            summary['status_classes'][key] = summary['status_classes'].get(key, 0) + count
+            summary['total'] += count
+            if exists is True:
+                summary['exists'] += count
+            elif exists is False:
+                summary['bad'] += count
+
+        cursor.execute('''
+            SELECT AVG(seconds), percentile_cont(ARRAY[0.5, 0.9, 0.99]) WITHIN GROUP (ORDER BY seconds)
+            FROM (SELECT (response_meta::json->>'seconds_elapsed')::double precision AS seconds
+                  FROM {table}
+                  WHERE crawl_id = %s) AS timings
+            WHERE seconds IS NOT NULL
+        '''.format(table=table), [crawl_id])
+        mean, percentiles = cursor.fetchone()
+    summary['seconds_elapsed'] = {
+        'mean': float(mean) if mean is not None else None,
+        'p50': percentiles[0] if percentiles else None,
+        'p90': percentiles[1] if percentiles else None,
+        'p99': percentiles[2] if percentiles else None,
+    }
+    return summary
+
+
+CRAWL_CHANGES = ('newly_broken', 'newly_fixed', 'still_broken')
+CRAWL_DIFF_FIELDNAMES = ('url', 'change', 'old_status_code', 'new_status_code', 'broken_since')
+
+# Each url's status in a crawl. A url inspected more than once in a crawl is broken if any inspection was.
+CRAWL_URLS_SQL = '''
+    SELECT url, bool_and("exists" IS NOT FALSE) AS ok, MAX({status_code}) AS status_code
+    FROM {table}
+    WHERE crawl_id = %s
+    GROUP BY url
+'''
+
+
+def crawl_diff_query(old_crawl_id, new_crawl_id, changes=None):
+    '''
+    SQL and params comparing the urls of two crawls in one pass, for the changes (default: all of
+    CRAWL_CHANGES) between them. A url missing from the old crawl counts as having worked before.
+    broken_since is when the url last broke, from the URLHealthChange history.
+    '''
+    changes = [change for change in (changes or CRAWL_CHANGES) if change in CRAWL_CHANGES]
+    table = connection.ops.quote_name(URLInspection._meta.db_table)
+    crawl_urls = CRAWL_URLS_SQL.format(status_code=STATUS_CODE_SQL, table=table)
+    sql = '''
+        WITH old AS ({crawl_urls}), new AS ({crawl_urls}),
+        diff AS (
+            SELECT new.url,
+                   CASE WHEN NOT new.ok AND (old.ok IS NULL OR old.ok) THEN 'newly_broken'
+                        WHEN new.ok AND old.ok IS FALSE THEN 'newly_fixed'
+                        WHEN NOT new.ok AND old.ok IS FALSE THEN 'still_broken'
+                   END AS change,
+                   old.status_code AS old_status_code,
+                   new.status_code AS new_status_code
+            FROM new LEFT JOIN old ON old.url = new.url
+        )
+        SELECT diff.url, diff.change, diff.old_status_code, diff.new_status_code,
+               (SELECT MAX(h.changed_at) FROM {health_table} AS h
+                WHERE h.url = diff.url AND NOT h."exists") AS broken_since
+        FROM diff
+        WHERE diff.change IN ({placeholders})
+        ORDER BY diff.change, diff.url
+    '''.format(crawl_urls=crawl_urls,
+               health_table=connection.ops.quote_name(URLHealthChange._meta.db_table),
+               placeholders=', '.join(['%s'] * len(changes)))
+    return sql, [old_crawl_id, new_crawl_id] + changes
+
+
+def stream_crawl_diff(old_crawl_id, new_crawl_id, changes=None, itersize=2000):
+    '''Yield a dict of CRAWL_DIFF_FIELDNAMES for each changed (or still broken) url (see crawl_diff_query)'''
+    sql, params = crawl_diff_query(old_crawl_id, new_crawl_id, changes=changes)
+    name = 'crawl_diff_{}_{}'.format(old_crawl_id, new_crawl_id)
+    return stream_query(name, sql, params, CRAWL_DIFF_FIELDNAMES, itersize=itersize)
+
+
+def record_url_health(crawl_id):
+    '''
+    Add a URLHealthChange for each url of a crawl whose status differs from its latest recorded change
+    (or that has no history yet), in one INSERT ... SELECT. Returns the number of changes recorded.
+    '''
+    table = connection.ops.quote_name(URLInspection._meta.db_table)
+    health_table = connection.ops.quote_name(URLHealthChange._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute('''
+            WITH current AS (
+                SELECT url, bool_and("exists" IS NOT FALSE) AS ok, MAX({status_code}) AS status_code,
+                       MIN(created_at) AS inspected_at
+                FROM {table}
+                WHERE crawl_id = %s
+                GROUP BY url
+            ),
+            latest AS (
+                SELECT DISTINCT ON (url) url, "exists"
+                FROM {health_table}
+                WHERE url IN (SELECT url FROM current)
+                ORDER BY url, changed_at DESC
+            )
+            INSERT INTO {health_table} (url, crawl_id, "exists", status_code, changed_at)
+            SELECT current.url, %s, current.ok, current.status_code, current.inspected_at
+            FROM current LEFT JOIN latest ON latest.url = current.url
+            WHERE latest.url IS NULL OR latest."exists" <> current.ok
+        '''.format(status_code=STATUS_CODE_SQL, table=table, health_table=health_table), [crawl_id, crawl_id])
+        return cursor.rowcount
@@ -0,0 +1,82 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+from crawler.models import (URLInspection, RelatedObject)
+from common.utils import reserve_ids
+
+
+def inspection_exists(info):
+    '''Whether the inspected resource exists, from a generate_url_info() dict (None if unknown)'''
+    status_code = info.get('status_code', None)
+    if status_code:
+        # A 304 answers a conditional request: the resource exists and hasn't changed
+        return int(status_code) in (200, 304)
+    # Connection errors, timeouts, etc. are as bad a link as a 404
+    return False if info.get('error', None) else None
+
+
+def job_related_objects(job):
+    '''A new list of a job's related object dicts, from its 'related_objects' and 'related_object' '''
+    related_objects = list(job.get('related_objects', None) or [])
+    if job.get('related_object', None):
+        related_objects.append(job['related_object'])
+    return related_objects
+
+
+class InspectionWriter(object):
+
+    """
+    Buffers inspection results and saves them in bulk.
+
+    add() takes a job (with a 'url' and optional 'related_object' or 'related_objects') and the info
+    from inspecting it. Every buffer_size results, and on flush(), the buffered URLInspections (with
+    exists and last_visited already set) and their RelatedObjects are saved with one bulk_create each,
+    in one transaction. Content types are looked up by natural key, which ContentType's manager caches.
+    """
+
+    def __init__(self, crawl_id=None, buffer_size=1000):
+        self.crawl_id = crawl_id
+        self.buffer_size = buffer_size
+        self.pending = []
+        self.inspection_ids = []
+
+    def add(self, job, info):
+        self.pending.append((job, info))
+        if len(self.pending) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        '''Save the buffered results, returning the new inspections' ids'''
+        if not self.pending:
+            return []
+        now = timezone.now()
+        inspections = []
+        related_objects = []
+        with transaction.atomic():
+            inspection_ids = reserve_ids(URLInspection, len(self.pending))
+            for (job, info), inspection_id in zip(self.pending, inspection_ids):
+                exists = inspection_exists(info)
+                inspections.append(URLInspection(id=inspection_id,
+                                                 url=info['url'],
+                                                 response_meta=info,
+                                                 crawl_id=self.crawl_id,
+                                                 exists=exists,
+                                                 last_visited=now if exists else None))
+                for related_object in job_related_objects(job):
+                    content_type = ContentType.objects.get_by_natural_key(related_object['app_label'],
+                                                                          related_object['model'])
+                    related_objects.append(RelatedObject(inspection_id=inspection_id,
+                                                         content_type=content_type,
+                                                         object_id=related_object['id']))
+            URLInspection.objects.bulk_create(inspections)
+            RelatedObject.objects.bulk_create(related_objects)
+        self.pending = []
+        self.inspection_ids.extend(inspection_ids)
+        return inspection_ids
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
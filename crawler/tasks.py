@@ -1,29 +1,18 @@
-from celery import shared_task
+from celery import chain, chord, group, shared_task
 from celery.utils.log import get_task_logger
 import requests
-from django.utils import timezone
+from django.conf import settings
 from django.db import DatabaseError
+from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
-from crawler.models import (URLInspection, RelatedObject)
+from crawler.engine import CrawlEngine, dedupe_jobs, generate_url_info, host_batches, response_validators
+from crawler.models import (Crawl, URLInspection)
+from crawler.reports import crawl_summary, record_url_health
+from crawler.results import InspectionWriter, inspection_exists
 
 logger = get_task_logger(__name__)
 
 
-def generate_url_info(url, response):
-    '''Generate some information about a url and a response'''
-    return {
-        'url': url,
-        'status_code': response.status_code,
-        'is_redirect': response.is_redirect,
-        'is_permanent_redirect': response.is_permanent_redirect,
-        'url_history': [h.url for h in response.history],
-        'final_url': response.url,
-        'headers': dict(response.headers),
-        'method': response.request.method if response.request else None,
-        'seconds_elapsed': response.elapsed.total_seconds() if response.elapsed else None
-    }
-
-
 @shared_task
 def stream_url_bytes(url, amt=16, timeout=(9.05, 12.05), verify_ssl=False):
     '''
@@ -63,33 +52,135 @@ def inspect_url(url, method='HEAD', related_object=None, stream=False):
     info = stream_url_bytes(url) if stream else request_url(url, method=method)
     result = info.copy()
     crawl_id = related_object.get('crawl_id', None) if related_object else None
+    writer = InspectionWriter(crawl_id=crawl_id)
+    writer.add({'url': url, 'related_object': related_object}, info)
     try:
-        inspection = URLInspection.objects.create(url=url,
-                                                  response_meta=info,
-                                                  crawl_id=crawl_id)
-    except DatabaseError as e:
+        inspection_ids = writer.flush()
+    except (DatabaseError, ContentType.DoesNotExist) as e:
         logger.exception(e)
         return
-    status_code = info.get('status_code', None)
-    if status_code:
-        inspection.exists = True if int(status_code) == 200 else False
-        if inspection.exists:
-            inspection.last_visited = timezone.now()
     if related_object:
-        try:
-            app_label = related_object.get('app_label', None)
-            model = related_object.get('model', None)
-            object_id = related_object.get('id', None)
-            content_type = ContentType.objects.get(app_label=app_label, model=model)
-            RelatedObject.objects.create(inspection=inspection,
-                                         content_type=content_type,
-                                         object_id=object_id)
-            result['related_object'] = related_object
-        except Exception as e:
-            logger.exception(e)
-
-    inspection.save()
-
-    result['inspection_id'] = inspection.id
+        result['related_object'] = related_object
+
+    result['inspection_id'] = inspection_ids[0]
 
     return result
+
+
+def previous_validators(urls):
+    '''The ETag/Last-Modified validators from the latest successful inspection of each of urls'''
+    # Both descending, so DISTINCT ON reads the (url, created_at) index backwards instead of sorting
+    inspections = (URLInspection.objects.filter(url__in=set(urls), exists=True)
+                                        .order_by('-url', '-created_at')
+                                        .distinct('url')
+                                        .values_list('url', 'response_meta'))
+    validators = {}
+    for url, response_meta in inspections:
+        url_validators = (response_meta.get('validators', None) or
+                          response_validators(response_meta.get('headers', None) or {}))
+        if url_validators:
+            validators[url] = url_validators
+    return validators
+
+
+@shared_task
+def inspect_urls(jobs, crawl_id=None, method='HEAD', stream=False, revalidate=None, record=True):
+    '''
+    Inspect a batch of urls with CrawlEngine and save the results in bulk.
+    jobs is a list of dicts with a 'url' and, optionally, a 'related_object' like inspect_url's or a
+    list of 'related_objects' to link to the url's one inspection.
+    Unless revalidate is False (default: the CRAWLER_REVALIDATE setting), requests for urls that were
+    inspected before are conditional, so unchanged resources are answered with a 304.
+    With record=False, nothing is saved and the [job, info] results are returned for record_inspections.
+    '''
+    logger.info('Inspecting {} URLs'.format(len(jobs)))
+    if revalidate is None:
+        revalidate = getattr(settings, 'CRAWLER_REVALIDATE', True)
+    if revalidate:
+        validators = previous_validators(job['url'] for job in jobs)
+        for job in jobs:
+            if job['url'] in validators:
+                job['validators'] = validators[job['url']]
+    engine = CrawlEngine(concurrency=getattr(settings, 'CRAWLER_CONCURRENCY', 20),
+                         per_host_concurrency=getattr(settings, 'CRAWLER_PER_HOST_CONCURRENCY', 2),
+                         per_host_delay=getattr(settings, 'CRAWLER_PER_HOST_DELAY', 0.5),
+                         method=method,
+                         stream=stream)
+    results = engine.inspect(jobs)
+    if not record:
+        return [[job, info] for job, info in results]
+    try:
+        with InspectionWriter(crawl_id=crawl_id, buffer_size=len(results) or 1) as writer:
+            for job, info in results:
+                writer.add(job, info)
+    except (DatabaseError, ContentType.DoesNotExist) as e:
+        logger.exception(e)
+        return
+    return {
+        'inspected': len(writer.inspection_ids),
+        'exists': sum(1 for job, info in results if inspection_exists(info)),
+        'not_modified': sum(1 for job, info in results if info.get('not_modified', False)),
+    }
+
+
+@shared_task
+def collect_inspections(previous_results, jobs, **kwargs):
+    '''inspect_urls(jobs, record=False), appending to the results of the previous task in a chain'''
+    return previous_results + inspect_urls(jobs, record=False, **kwargs)
+
+
+@shared_task
+def record_inspections(results, crawl_id=None, buffer_size=None):
+    '''
+    Chord callback that saves the [job, info] results of every batch of a crawl, buffer_size
+    (default: the CRAWLER_WRITE_BUFFER_SIZE setting) inspections per transaction
+    '''
+    if buffer_size is None:
+        buffer_size = getattr(settings, 'CRAWLER_WRITE_BUFFER_SIZE', 5000)
+    with InspectionWriter(crawl_id=crawl_id, buffer_size=buffer_size) as writer:
+        for batch_results in results:
+            for job, info in batch_results:
+                writer.add(job, info)
+    return {'inspected': len(writer.inspection_ids)}
+
+
+def schedule_inspections(jobs, crawl_id=None, batch_size=None, defer_writes=None, **kwargs):
+    '''
+    Plan a crawl of jobs: each url (once normalized) is inspected once, for all of its related objects, and
+    urls are batched by host (see crawler.engine.host_batches). Returns a celery group of inspect_urls tasks,
+    with a chain of them for each host that needs several batches. kwargs are passed on to inspect_urls.
+
+    With defer_writes (default: the CRAWLER_DEFER_WRITES setting), batches save nothing and a chord
+    callback, record_inspections, saves the whole crawl in a few large transactions instead. Every result
+    then passes through the celery result backend. Crawls are summarized by summarize_crawl when done.
+    '''
+    if batch_size is None:
+        batch_size = getattr(settings, 'CRAWLER_BATCH_SIZE', 500)
+    if defer_writes is None:
+        defer_writes = getattr(settings, 'CRAWLER_DEFER_WRITES', False)
+    tasks = []
+    for batches in host_batches(dedupe_jobs(jobs), batch_size):
+        if defer_writes:
+            signatures = [collect_inspections.si([], batches[0], **kwargs)]
+            signatures.extend(collect_inspections.s(batch, **kwargs) for batch in batches[1:])
+        else:
+            signatures = [inspect_urls.si(batch, crawl_id=crawl_id, **kwargs) for batch in batches]
+        tasks.append(signatures[0] if len(signatures) == 1 else chain(*signatures))
+    if crawl_id is None:
+        return chord(tasks, record_inspections.s()) if defer_writes else group(tasks)
+    # Summarize the crawl once every batch is saved
+    if defer_writes:
+        return chord(tasks, record_inspections.s(crawl_id=crawl_id) | summarize_crawl.si(crawl_id))
+    return chord(tasks, summarize_crawl.si(crawl_id))
+
+
+@shared_task
+def summarize_crawl(crawl_id):
+    '''
+    Record changes in URL health from a crawl (see crawler.reports.record_url_health), then store
+    its summary (see crawler.reports.crawl_summary) and mark it finished
+    '''
+    record_url_health(crawl_id)
+    summary = crawl_summary(crawl_id)
+    Crawl.objects.filter(id=crawl_id).update(summary=summary, finished_at=timezone.now())
+    return summary
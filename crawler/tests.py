@@ -1,3 +1,90 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from crawler.engine import CrawlEngine, dedupe_jobs, host_batches
+from crawler.results import job_related_objects
+import threading
 
-# Create your tests here.
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    """Answers /ok with a 200 (or a 304 if its ETag matches) and anything else with a 404."""
+
+    etag = '"v1"'
+
+    def do_HEAD(self):
+        if self.path != '/ok':
+            self.send_response(404)
+        elif self.headers.get('If-None-Match', None) == self.etag:
+            self.send_response(304)
+        else:
+            self.send_response(200)
+            self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class CrawlEngineTests(SimpleTestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), StubHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.base_url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_inspect(self):
+        jobs = [{'url': self.base_url + path, 'id': i} for i, path in enumerate(['/ok', '/missing', '/ok'])]
+        results = CrawlEngine(per_host_delay=0).inspect(jobs)
+        status_codes = dict((job['id'], info['status_code']) for job, info in results)
+        self.assertEqual(status_codes, {0: 200, 1: 404, 2: 200})
+
+    def test_revalidation(self):
+        job, info = CrawlEngine().inspect([{'url': self.base_url + '/ok'}])[0]
+        self.assertEqual(info['validators'], {'etag': StubHandler.etag})
+        self.assertFalse(info['not_modified'])
+
+        job, info = CrawlEngine().inspect([{'url': self.base_url + '/ok', 'validators': info['validators']}])[0]
+        self.assertEqual(info['status_code'], 304)
+        self.assertTrue(info['not_modified'])
+        self.assertEqual(info['validators'], {'etag': StubHandler.etag})
+
+    def test_connection_error(self):
+        results = CrawlEngine(timeout=1).inspect([{'url': 'http://127.0.0.1:1/ok'}])
+        job, info = results[0]
+        self.assertIsNone(info['status_code'])
+        self.assertIn('error', info)
+
+
+class CrawlPlanTests(SimpleTestCase):
+
+    def test_dedupe_jobs(self):
+        jobs = [
+            {'url': 'http://example.gov/data', 'related_object': {'id': 1}},
+            {'url': 'HTTP://Example.gov:80/data#download', 'related_object': {'id': 2}},
+            {'url': 'http://example.gov/other', 'related_object': {'id': 3}},
+        ]
+        merged = dedupe_jobs(jobs)
+        self.assertEqual([job['url'] for job in merged], ['http://example.gov/data', 'http://example.gov/other'])
+        self.assertEqual(merged[0]['related_objects'], [{'id': 1}, {'id': 2}])
+
+    def test_host_batches(self):
+        jobs = [{'url': 'http://big.gov/{}'.format(i)} for i in range(5)]
+        jobs += [{'url': 'http://small{}.gov/'.format(i)} for i in range(3)]
+        sequences = host_batches(jobs, 2)
+        self.assertEqual([len(batch) for batch in sequences[0]], [2, 2, 1])
+        self.assertEqual(sorted(len(batches) for batches in sequences[1:]), [1, 1])
+
+    def test_job_related_objects(self):
+        job = {'url': 'http://example.gov/data', 'related_objects': [{'id': 1}], 'related_object': {'id': 2}}
+        related_objects = job_related_objects(job)
+        self.assertEqual(related_objects, [{'id': 1}, {'id': 2}])
+        # Appending to the result (as a writer accumulating RelatedObjects might) leaves the job alone
+        related_objects.append({'id': 3})
+        self.assertEqual(job['related_objects'], [{'id': 1}])
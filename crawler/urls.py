@@ -1,9 +1,10 @@
 from django.conf.urls import patterns, url
-from crawler.views import (CrawlDetailView, CrawlListView, URLInspectionDetailView)
+from crawler.views import (CrawlDetailView, CrawlDiffView, CrawlListView, URLInspectionDetailView)
 
 urlpatterns = patterns(
     'crawler.views',
     url(r'crawls/$', CrawlListView.as_view(), name='crawl-list'),
     url(r'crawls/(?P<pk>[0-9]+)/$', CrawlDetailView.as_view(), name='crawl-detail'),
+    url(r'crawls/(?P<pk>[0-9]+)/diff/(?P<other_pk>[0-9]+)/$', CrawlDiffView.as_view(), name='crawl-diff'),
     url(r'url-inspections/(?P<pk>[0-9]+)/$', URLInspectionDetailView.as_view(), name='urlinspection-detail'),
 )
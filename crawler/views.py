@@ -1,26 +1,61 @@
+from django.shortcuts import get_object_or_404
 from django.views.generic import DetailView, ListView
-from django.views.generic.detail import SingleObjectMixin
-from crawler.models import (Crawl, URLInspection)
+from crawler.models import (Crawl, URLInspection, URLHealthChange)
+from crawler.reports import CRAWL_CHANGES, crawl_summary, stream_crawl_diff
 
 
-class CrawlDetailView(SingleObjectMixin, ListView):
+class CrawlDetailView(DetailView):
+
+    """
+    A crawl's summary and its inspections, by url. Inspections are paged by keyset rather than offset:
+    ?after=<id> (or ?before=<id>) shows the page after (or before) that inspection, in (url, id) order,
+    which the (crawl, url, id) index serves in the same time for any page. ?last=1 shows the last page.
+    """
+
     model = Crawl
     paginate_by = 50
     template_name = 'crawler/crawl_detail.html'
 
-    def get(self, request, *args, **kwargs):
-        self.object = self.get_object(queryset=Crawl.objects.all())
-        return super(CrawlDetailView, self).get(request, *args, **kwargs)
+    def get_cursor(self, name):
+        try:
+            inspection_id = int(self.request.GET.get(name, ''))
+        except ValueError:
+            return None
+        return self.object.urlinspection_set.filter(id=inspection_id).values_list('url', 'id').first()
+
+    def get_page(self):
+        '''The page of inspections, plus whether there are pages before and after it'''
+        queryset = self.object.urlinspection_set.all()
+        after = self.get_cursor('after')
+        before = self.get_cursor('before')
+        if before is not None or self.request.GET.get('last', None):
+            if before is not None:
+                queryset = queryset.extra(where=['(url, id) < (%s, %s)'], params=list(before))
+            page = list(queryset.order_by('-url', '-id')[:self.paginate_by + 1])
+            has_previous = len(page) > self.paginate_by
+            page = list(reversed(page[:self.paginate_by]))
+            return page, has_previous, before is not None
+        if after is not None:
+            queryset = queryset.extra(where=['(url, id) > (%s, %s)'], params=list(after))
+        page = list(queryset.order_by('url', 'id')[:self.paginate_by + 1])
+        return page[:self.paginate_by], after is not None, len(page) > self.paginate_by
 
     def get_context_data(self, **kwargs):
         context = super(CrawlDetailView, self).get_context_data(**kwargs)
+        page, has_previous, has_next = self.get_page()
         context['crawl'] = self.object
+        context['object_list'] = page
+        context['has_previous'] = has_previous
+        context['has_next'] = has_next
+        context['is_paginated'] = has_previous or has_next
+        if page:
+            context['first_id'] = page[0].id
+            context['last_id'] = page[-1].id
+        # Crawls still running (or from before summaries) are summarized on the fly
+        context['summary'] = self.object.summary or crawl_summary(self.object.id)
+        context['status_classes'] = sorted(context['summary']['status_classes'].items())
         return context
 
-    def get_queryset(self):
-        # Paginate inspection objects
-        return self.object.urlinspection_set.order_by('url')
-
 
 class CrawlListView(ListView):
     model = Crawl
@@ -28,6 +63,34 @@ class CrawlListView(ListView):
     ordering = ('-created_at',)
 
 
+class CrawlDiffView(DetailView):
+
+    """Urls that broke, were fixed or are still broken in a crawl, compared with an older crawl (other_pk)."""
+
+    model = Crawl
+    template_name = 'crawler/crawl_diff.html'
+    rows_per_change = 500
+
+    def get_context_data(self, **kwargs):
+        context = super(CrawlDiffView, self).get_context_data(**kwargs)
+        old_crawl = get_object_or_404(Crawl, pk=self.kwargs['other_pk'])
+        counts = dict((change, 0) for change in CRAWL_CHANGES)
+        rows = dict((change, []) for change in CRAWL_CHANGES)
+        for row in stream_crawl_diff(old_crawl.id, self.object.id):
+            counts[row['change']] += 1
+            if len(rows[row['change']]) < self.rows_per_change:
+                rows[row['change']].append(row)
+        context['old_crawl'] = old_crawl
+        context['changes'] = [(change.replace('_', ' '), counts[change], rows[change]) for change in CRAWL_CHANGES]
+        context['rows_per_change'] = self.rows_per_change
+        return context
+
+
 class URLInspectionDetailView(DetailView):
     model = URLInspection
 
+    def get_context_data(self, **kwargs):
+        context = super(URLInspectionDetailView, self).get_context_data(**kwargs)
+        context['health_changes'] = URLHealthChange.objects.filter(url=self.object.url).order_by('-changed_at')
+        return context
+
@@ -3,6 +3,7 @@ from __future__ import absolute_import
 import os
 
 from celery import Celery
+from celery.signals import worker_init
 
 # set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hallofjustice.settings')
@@ -20,3 +21,15 @@ app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 @app.task(bind=True)
 def debug_task(self):
     print('Request: {0!r}'.format(self.request))
+
+
+@worker_init.connect
+def close_connections_after_tasks(**kwargs):
+    '''
+    Don't keep database connections between tasks in workers. Celery closes them with Django's
+    close_old_connections, which honours CONN_MAX_AGE, and under eventlet every task runs in its own
+    short-lived green thread that would otherwise leave an open connection behind.
+    '''
+    from django.db import connections
+    for alias in connections:
+        connections.databases[alias]['CONN_MAX_AGE'] = 0
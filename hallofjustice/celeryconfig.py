@@ -16,10 +16,15 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = getattr(settings, 'TIME_ZONE', 'UTC')
 
 CELERYBEAT_SCHEDULE = {
-    # Updates search index every 2 hours
+    # Saves, deletes and bulk imports reach the search index within seconds (see search.signals),
+    # so this daily update only catches changes that skip both, like queryset updates
     'update-search-index': {
         'task': 'cjdata.tasks.update_search_index',
-        'schedule': crontab(minute=15, hour='*/2'),
-        'kwargs': {'age': 3},
+        'schedule': crontab(minute=15, hour=3),
+        'kwargs': {'age': 25},
+    },
+    'export-dataset-snapshots': {
+        'task': 'cjdata.tasks.export_dataset_snapshots',
+        'schedule': crontab(minute=0, hour=4),
     },
 }
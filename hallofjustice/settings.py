@@ -74,7 +74,41 @@ WSGI_APPLICATION = 'hallofjustice.wsgi.application'
 # https://docs.djangoproject.com/en/1.7/ref/settings/#databases
 
 DATABASES = {'default': dj_database_url.config()}
-# DATABASES['default']['ENGINE'] = 'django_postgrespool'
+# Keep each web thread's connection open between requests for this many seconds
+# (celery workers set it to 0, see hallofjustice/celery.py)
+DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DATABASE_CONN_MAX_AGE', 60))
+# With DATABASE_POOL_SIZE set (for eventlet celery workers, where every green thread would otherwise
+# open its own connection), each process shares a bounded pool of connections instead (see common.db.pooled)
+if os.getenv('DATABASE_POOL_SIZE'):
+    DATABASES['default'].update({
+        'ENGINE': 'common.db.pooled',
+        'CONN_MAX_AGE': 0,
+        'POOL_SIZE': int(os.getenv('DATABASE_POOL_SIZE')),
+        'POOL_TIMEOUT': 30,
+        'POOL_HEALTH_CHECK_INTERVAL': 30,
+    })
+
+# Cache
+# Each process gets its own in-memory cache unless CACHE_URL points at a shared Redis
+# database, e.g. redis://localhost/2, which lets processes see each others' invalidations.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if os.getenv('CACHE_URL', None):
+    CACHES['default'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.getenv('CACHE_URL'),
+    }
+
+# How often (in seconds) each process checks whether the category tree changed
+CATEGORY_TREE_CHECK_INTERVAL = 5
+
+# Category and location list pages, and their datasets tables, are cached for this many seconds,
+# keyed on a catalog version that Dataset and Category writes bump
+LIST_PAGE_CACHE_TIMEOUT = 60 * 60
 
 # Internationalization
 # https://docs.djangoproject.com/en/1.7/topics/i18n/
@@ -134,10 +168,60 @@ HAYSTACK_CONNECTIONS = {
 }
 # HAYSTACK_ROUTERS = ['search.routers.CJRouter', 'haystack.routers.DefaultRouter']
 
+# Saves and deletes of these models are queued and sent to the search index by a celery task,
+# SEARCH_UPDATE_DELAY seconds after the request (or every SEARCH_UPDATE_BATCH_SIZE objects)
+HAYSTACK_SIGNAL_PROCESSOR = 'search.signals.QueuedSignalProcessor'
+SEARCH_QUEUED_MODELS = ('cjdata.Dataset', 'cjdata.Category')
+SEARCH_UPDATE_DELAY = 5
+SEARCH_UPDATE_BATCH_SIZE = 500
+
+# Options for the Elasticsearch client that every haystack connection to the same URL shares in a
+# process (see search.clients). maxsize is the number of keep-alive connections kept per host: one is
+# enough for a sync gunicorn worker, an eventlet worker needs about as many as its concurrent searches.
+ELASTICSEARCH_CLIENT_OPTIONS = {
+    'maxsize': int(os.getenv('ELASTICSEARCH_POOL_SIZE', 10)),
+    'max_retries': 2,
+    'retry_on_timeout': True,
+}
+
 ELASTICSEARCH_INDEX_SETTINGS = import_string('search.settings.DATASET_INDEX_SETTINGS')
 ELASTICSEARCH_DEFAULT_ANALYZER = 'cjdata_analyzer'
 ELASTICSEARCH_MINIMUM_SHOULD_MATCH = '80%'
 
+# Search results (hit ids, totals and facet counts) are cached in each process,
+# keyed on the normalized search and the index generation bumped by index updates
+SEARCH_RESULTS_CACHE_MAX_ENTRIES = 1000
+SEARCH_RESULTS_CACHE_TIMEOUT = 15 * 60
+
+# Search backend calls slower than this many seconds are logged (to the search.slow_queries logger)
+# and listed at /search/stats/
+SEARCH_SLOW_QUERY_THRESHOLD = 0.5
+
+# Number of related datasets stored for each dataset (see cjdata.related) and shown on its page
+RELATED_DATASETS_COUNT = 20
+
+# Seconds between checks for a new search index generation or category tree, either of which rebuilds
+# the in-process autocomplete vocabulary
+AUTOCOMPLETE_CHECK_INTERVAL = 30
+
+# Crawls inspect URLs in batches of CRAWLER_BATCH_SIZE per celery task. Each batch runs up to
+# CRAWLER_CONCURRENCY requests at once, and at most CRAWLER_PER_HOST_CONCURRENCY to a single host,
+# starting requests to a host at least CRAWLER_PER_HOST_DELAY seconds apart.
+CRAWLER_BATCH_SIZE = 500
+CRAWLER_CONCURRENCY = 20
+CRAWLER_PER_HOST_CONCURRENCY = 2
+CRAWLER_PER_HOST_DELAY = 0.5
+# Send If-None-Match/If-Modified-Since from a URL's last successful inspection, so unchanged resources answer 304
+CRAWLER_REVALIDATE = True
+# Save a whole crawl's inspections from a chord callback, CRAWLER_WRITE_BUFFER_SIZE per transaction,
+# instead of from each batch's task. Every inspection then passes through the celery result backend.
+CRAWLER_DEFER_WRITES = False
+CRAWLER_WRITE_BUFFER_SIZE = 5000
+
+# Directory for the gzipped CSV export snapshots written by cjdata.tasks.export_dataset_snapshots.
+# Web and celery workers have to share it.
+EXPORT_SNAPSHOT_ROOT = os.getenv('EXPORT_SNAPSHOT_ROOT', os.path.join(BASE_DIR, 'exports'))
+
 # See celeryconfig.py for Celery settings
 
 
@@ -0,0 +1,130 @@
+from bisect import bisect_left
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+from cjdata.categories import category_tree, category_tree_version
+from cjdata.models import Dataset
+from search.cache import LRUCache, index_generation
+import heapq
+import re
+import threading
+import time
+
+WORD_START_RE = re.compile(r'\b\w', re.UNICODE)
+MAX_COMPLETIONS = 100
+# Prefixes this short match a large share of keys, so their completions are computed up front
+SHORT_PREFIX_LENGTH = 2
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+
+class Vocabulary(object):
+
+    """
+    Every autocompletion term (tags, category paths, group names and dataset titles) with its
+    frequency, answering prefix queries from a sorted list of keys.
+
+    A term has a key for each word in it, starting at that word, so "jail" completes
+    "County Jail Population" as well as "Jails". Terms are deduplicated case-insensitively,
+    keeping the most frequent spelling.
+    """
+
+    def __init__(self, frequencies):
+        spellings = {}
+        totals = {}
+        for term, frequency in frequencies:
+            term = " ".join(term.split())
+            normalized = term.lower()
+            if not normalized:
+                continue
+            totals[normalized] = totals.get(normalized, 0) + frequency
+            best = spellings.get(normalized, None)
+            if best is None or frequency > best[1]:
+                spellings[normalized] = (term, frequency)
+
+        self.terms = []
+        self.frequencies = []
+        keys = []
+        for normalized, (term, frequency) in spellings.items():
+            term_id = len(self.terms)
+            self.terms.append(term)
+            self.frequencies.append(totals[normalized])
+            for match in WORD_START_RE.finditer(normalized):
+                keys.append((normalized[match.start():], term_id))
+        keys.sort()
+        self.keys = [key for key, term_id in keys]
+        self.term_ids = [term_id for key, term_id in keys]
+        self._completions = LRUCache(getattr(settings, 'AUTOCOMPLETE_CACHE_MAX_ENTRIES', 1000), 24 * 60 * 60)
+        self._short_completions = {}
+        for prefix in set(key[:length] for key in self.keys for length in range(1, SHORT_PREFIX_LENGTH + 1)):
+            self._short_completions[prefix] = self.best_terms(prefix, MAX_COMPLETIONS)
+
+    @staticmethod
+    def load_frequencies():
+        '''(term, number of datasets) for every tag, category path, group name and title'''
+        with connection.cursor() as cursor:
+            cursor.execute('''
+                SELECT tag, COUNT(*) FROM (SELECT unnest(tags) AS tag FROM {table}) AS t GROUP BY tag
+                '''.format(table=connection.ops.quote_name(Dataset._meta.db_table)))
+            frequencies = list(cursor.fetchall())
+
+        tree = category_tree()
+        through = Dataset.categories.through
+        counts = through.objects.values_list('category_id').annotate(num=Count('dataset_id')).order_by()
+        frequencies.extend((tree.path(category_id), num) for category_id, num in counts if tree.get(category_id))
+
+        for field in ('group_name', 'title'):
+            frequencies.extend(Dataset.objects.values_list(field).annotate(num=Count('pk')).order_by())
+        return frequencies
+
+    def __len__(self):
+        return len(self.terms)
+
+    def best_terms(self, prefix, limit):
+        start = bisect_left(self.keys, prefix)
+        stop = bisect_left(self.keys, prefix + '\uffff', start)
+        term_ids = set(self.term_ids[start:stop])
+        best = heapq.nsmallest(limit, term_ids, key=lambda i: (-self.frequencies[i], self.terms[i].lower()))
+        return [self.terms[i] for i in best]
+
+    def complete(self, prefix, limit=10):
+        '''The most frequent terms with a word starting with prefix'''
+        prefix = normalize(prefix)
+        limit = min(limit, MAX_COMPLETIONS)
+        if not prefix:
+            return []
+        if len(prefix) <= SHORT_PREFIX_LENGTH:
+            return self._short_completions.get(prefix, [])[:limit]
+        completions = self._completions.get(prefix)
+        if completions is None:
+            completions = self.best_terms(prefix, MAX_COMPLETIONS)
+            self._completions.set(prefix, completions)
+        return completions[:limit]
+
+
+_vocabulary = None
+_vocabulary_version = None
+_checked_at = None
+_lock = threading.Lock()
+
+
+def autocomplete_vocabulary():
+    '''
+    The process-wide Vocabulary. At most every AUTOCOMPLETE_CHECK_INTERVAL seconds, this checks the search
+    index generation and category tree version, and rebuilds the vocabulary if either changed.
+    '''
+    global _vocabulary, _vocabulary_version, _checked_at
+    now = time.time()
+    check_interval = getattr(settings, 'AUTOCOMPLETE_CHECK_INTERVAL', 30)
+    if _vocabulary is not None and _checked_at is not None and now - _checked_at < check_interval:
+        return _vocabulary
+    with _lock:
+        if _vocabulary is None or _checked_at is None or now - _checked_at >= check_interval:
+            version = (index_generation(), category_tree_version())
+            if _vocabulary is None or version != _vocabulary_version:
+                _vocabulary = Vocabulary(Vocabulary.load_frequencies())
+                _vocabulary_version = version
+            _checked_at = now
+    return _vocabulary
@@ -2,18 +2,22 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import threading
+import time
 import warnings
 
 from django.conf import settings
 
 import haystack
-from haystack.backends.elasticsearch_backend import ElasticsearchSearchEngine
+from haystack.backends.elasticsearch_backend import ElasticsearchSearchEngine, ElasticsearchSearchQuery
 from haystack.constants import DEFAULT_OPERATOR
 from haystack.backends import log_query
 from haystack.constants import DJANGO_CT
 from haystack.exceptions import MissingDependency
 from haystack.utils import get_model_ct
 from elasticstack.backends import ConfigurableElasticBackend
+from search.clients import shared_client
+from search.instrumentation import query_shape, search_stats
 
 try:
     import elasticsearch
@@ -23,15 +27,56 @@ except ImportError:
 
 class PliableSearchBackend(ConfigurableElasticBackend):
 
-    """Search that supports Elasticsearch synonyms, possibly more."""
+    """
+    Search that supports Elasticsearch synonyms, possibly more.
+
+    search, more_like_this and analyze_text calls are timed and recorded in
+    search.instrumentation.search_stats, with Elasticsearch's "took", hit counts and query shape.
+    Backends for the same URL share one Elasticsearch client (see search.clients.shared_client).
+    """
 
     DEFAULT_MINIMUM_MATCH = '50%'
 
-    def __init__(self, *args, **kwargs):
-        super(PliableSearchBackend, self).__init__(*args, **kwargs)
+    def __init__(self, connection_alias, **connection_options):
+        super(PliableSearchBackend, self).__init__(connection_alias, **connection_options)
+        # The client haystack just made hasn't opened any connections, so it can simply be dropped
+        self.conn = shared_client(connection_options)
         user_minimum_match = getattr(settings, 'ELASTICSEARCH_MINIMUM_SHOULD_MATCH', None)
         if user_minimum_match:
             setattr(self, 'DEFAULT_MINIMUM_MATCH', user_minimum_match)
+        # The body, "took" and shard count of this thread's current call, for instrumentation
+        self._current = threading.local()
+
+    def _reset_current(self):
+        self._current.body = None
+        self._current.took = None
+        self._current.shards = None
+
+    def search(self, query_string, **kwargs):
+        self._reset_current()
+        start = time.perf_counter()
+        results = super(PliableSearchBackend, self).search(query_string, **kwargs)
+        body = self._current.body
+        search_stats.record('search', query_shape(body) if body else 'none', time.perf_counter() - start,
+                            took=self._current.took, hits=results.get('hits', None),
+                            shards=self._current.shards, body=body)
+        return results
+
+    def more_like_this(self, model_instance, additional_query_string=None, **kwargs):
+        self._reset_current()
+        start = time.perf_counter()
+        results = super(PliableSearchBackend, self).more_like_this(model_instance, additional_query_string,
+                                                                   **kwargs)
+        search_stats.record('more_like_this', get_model_ct(model_instance), time.perf_counter() - start,
+                            took=self._current.took, hits=results.get('hits', None),
+                            shards=self._current.shards,
+                            body={'id': model_instance.pk, 'additional_query_string': additional_query_string})
+        return results
+
+    def _process_results(self, raw_results, *args, **kwargs):
+        self._current.took = raw_results.get('took', None)
+        self._current.shards = raw_results.get('_shards', {}).get('total', None)
+        return super(PliableSearchBackend, self)._process_results(raw_results, *args, **kwargs)
 
     def build_search_kwargs(self, query_string, sort_by=None, start_offset=0, end_offset=None,
                             fields='', highlight=False, facets=None,
@@ -39,7 +84,7 @@ class PliableSearchBackend(ConfigurableElasticBackend):
                             narrow_queries=None, spelling_query=None,
                             within=None, dwithin=None, distance_point=None,
                             models=None, limit_to_registered_models=None,
-                            result_class=None):
+                            result_class=None, term_filters=None):
         index = haystack.connections[self.connection_alias].get_unified_index()
         content_field = index.document_field
 
@@ -208,6 +253,10 @@ class PliableSearchBackend(ConfigurableElasticBackend):
         if len(model_choices) > 0:
             filters.append({"terms": {DJANGO_CT: model_choices}})
 
+        # Exact-value filters need no query parsing or analysis, and ES caches each one as a bitset
+        for field, value in term_filters or []:
+            filters.append({'term': {field: value}})
+
         for q in narrow_queries:
             filters.append({
                 'fquery': {
@@ -272,6 +321,7 @@ class PliableSearchBackend(ConfigurableElasticBackend):
             else:
                 kwargs['query']['filtered']["filter"] = {"bool": {"must": filters}}
 
+        self._current.body = kwargs
         return kwargs
 
     @log_query
@@ -283,8 +333,36 @@ class PliableSearchBackend(ConfigurableElasticBackend):
         }
         if analyzer:
             kwargs['analyzer'] = analyzer
-        return self.conn.indices.analyze(**kwargs)
+        start = time.perf_counter()
+        result = self.conn.indices.analyze(**kwargs)
+        search_stats.record('analyze_text', analyzer or 'default', time.perf_counter() - start,
+                            hits=len(result.get('tokens', [])), body=kwargs)
+        return result
+
+
+class PliableSearchQuery(ElasticsearchSearchQuery):
+
+    """Adds term filters: exact (field, value) matches, for narrowing by selected facets."""
+
+    def __init__(self, *args, **kwargs):
+        super(PliableSearchQuery, self).__init__(*args, **kwargs)
+        self.term_filters = []
+
+    def add_term_filter(self, field, value):
+        self.term_filters.append((field, value))
+
+    def build_params(self, spelling_query=None, **kwargs):
+        kwargs = super(PliableSearchQuery, self).build_params(spelling_query=spelling_query, **kwargs)
+        if self.term_filters:
+            kwargs['term_filters'] = list(self.term_filters)
+        return kwargs
+
+    def _clone(self, klass=None, using=None):
+        clone = super(PliableSearchQuery, self)._clone(klass=klass, using=using)
+        clone.term_filters = list(self.term_filters)
+        return clone
 
 
 class PliableSearchEngine(ElasticsearchSearchEngine):
     backend = PliableSearchBackend
+    query = PliableSearchQuery
@@ -0,0 +1,84 @@
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+import hashlib
+import json
+import threading
+import time
+
+INDEX_GENERATION_KEY = 'search:index_generation'
+
+
+class LRUCache(object):
+
+    """A small thread-safe in-process cache that expires entries after timeout seconds and evicts the least recently used."""
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, None)
+            if item is None:
+                return default
+            expires, value = item
+            if expires < time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.time() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+search_results_cache = LRUCache(getattr(settings, 'SEARCH_RESULTS_CACHE_MAX_ENTRIES', 1000),
+                                getattr(settings, 'SEARCH_RESULTS_CACHE_TIMEOUT', 15 * 60))
+
+
+def index_generation():
+    '''A number in the shared cache that changes whenever the search index is updated'''
+    generation = cache.get(INDEX_GENERATION_KEY)
+    if generation is None:
+        cache.add(INDEX_GENERATION_KEY, int(time.time()), None)
+        generation = cache.get(INDEX_GENERATION_KEY)
+    return generation
+
+
+def bump_index_generation():
+    '''Make every process stop using search results cached before the index was updated'''
+    try:
+        cache.incr(INDEX_GENERATION_KEY)
+    except ValueError:
+        cache.set(INDEX_GENERATION_KEY, int(time.time()), None)
+    search_results_cache.clear()
+
+
+def search_cache_key(query, selected_facets, parse_query):
+    '''
+    Cache key for a search, from the query with its whitespace normalized, the selected facets
+    (order and duplicates don't matter), the parse_query flag and the current index generation.
+    Case is kept, since the analyzer has case-sensitive synonyms.
+    '''
+    normalized = {
+        'q': " ".join(query.split()),
+        'selected_facets': sorted(set(facet for facet in selected_facets if ':' in facet)),
+        'parse_query': bool(parse_query),
+        'generation': index_generation(),
+    }
+    digest = hashlib.sha1(json.dumps(normalized, sort_keys=True).encode('utf-8')).hexdigest()
+    return 'search:{}'.format(digest)
@@ -0,0 +1,108 @@
+from django.conf import settings
+from elasticsearch.connection import Urllib3HttpConnection
+import elasticsearch
+import os
+import threading
+import time
+
+_lock = threading.RLock()
+_clients = {}
+_metrics = {}
+_pid = None
+
+
+class PoolMetrics(object):
+
+    """Counts and timings of the requests sent through one host's connection pool."""
+
+    def __init__(self, host):
+        self.host = host
+        self.pool = None
+        self.requests = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    def record(self, seconds, error=False):
+        with _lock:
+            self.requests += 1
+            self.seconds += seconds
+            if error:
+                self.errors += 1
+
+    def summary(self):
+        summary = {
+            'requests': self.requests,
+            'errors': self.errors,
+            'mean_ms': self.seconds / self.requests * 1000 if self.requests else None,
+        }
+        if self.pool is not None:
+            # Sockets opened over the pool's life, and how many are idle and ready for reuse
+            summary['connections_opened'] = self.pool.num_connections
+            # (urllib3 fills the empty slots of its queue with None)
+            summary['idle_connections'] = sum(1 for conn in list(self.pool.pool.queue) if conn) if self.pool.pool else 0
+            summary['maxsize'] = self.pool.pool.maxsize if self.pool.pool else None
+        return summary
+
+
+class MeteredConnection(Urllib3HttpConnection):
+
+    """A keep-alive urllib3 connection (pool) to one Elasticsearch host that records PoolMetrics."""
+
+    def __init__(self, *args, **kwargs):
+        super(MeteredConnection, self).__init__(*args, **kwargs)
+        with _lock:
+            self.metrics = _metrics.setdefault(self.host, PoolMetrics(self.host))
+            self.metrics.pool = self.pool
+
+    def perform_request(self, *args, **kwargs):
+        start = time.perf_counter()
+        error = True
+        try:
+            response = super(MeteredConnection, self).perform_request(*args, **kwargs)
+            error = False
+            return response
+        finally:
+            self.metrics.record(time.perf_counter() - start, error=error)
+
+
+def client_options(connection_options):
+    '''
+    Elasticsearch client options for a haystack connection: no sniffing (the cluster is addressed by
+    one URL), the connection's TIMEOUT, then ELASTICSEARCH_CLIENT_OPTIONS, then the connection's KWARGS
+    '''
+    options = {
+        'connection_class': MeteredConnection,
+        'sniff_on_start': False,
+        'sniff_on_connection_fail': False,
+        'sniffer_timeout': None,
+        'timeout': connection_options.get('TIMEOUT', 10),
+    }
+    options.update(getattr(settings, 'ELASTICSEARCH_CLIENT_OPTIONS', {}))
+    options.update(connection_options.get('KWARGS', {}))
+    return options
+
+
+def shared_client(connection_options):
+    '''
+    The Elasticsearch client for a haystack connection's URL and client options, shared by every
+    backend in this process, so searches reuse its keep-alive connections instead of each backend
+    (one per thread or green thread) opening its own. A forked process starts with new clients.
+    '''
+    global _pid
+    options = client_options(connection_options)
+    key = (str(connection_options['URL']), tuple(sorted((name, repr(value)) for name, value in options.items())))
+    with _lock:
+        if _pid != os.getpid():
+            _clients.clear()
+            _metrics.clear()
+            _pid = os.getpid()
+        client = _clients.get(key, None)
+        if client is None:
+            client = _clients[key] = elasticsearch.Elasticsearch(connection_options['URL'], **options)
+    return client
+
+
+def connection_stats():
+    '''PoolMetrics summaries for this process, by host'''
+    with _lock:
+        return dict((host, metrics.summary()) for host, metrics in _metrics.items())
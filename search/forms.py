@@ -36,8 +36,8 @@ class PliableFacetedSearchForm(PliableSearchForm):
     def search(self):
         sqs = super(PliableFacetedSearchForm, self).search()
 
-        # We need to process each facet to ensure that the field name and the
-        # value are quoted correctly and separately:
+        # Selected facets become exact term filters where the backend supports them,
+        # otherwise we need to quote the field name and the value correctly and separately:
         for facet in self.selected_facets:
             if ":" not in facet:
                 continue
@@ -45,6 +45,10 @@ class PliableFacetedSearchForm(PliableSearchForm):
             field, value = facet.split(":", 1)
 
             if value:
-                sqs = sqs.narrow(u'%s:"%s"' % (field, sqs.query.clean(value)))
+                if hasattr(sqs.query, 'add_term_filter'):
+                    sqs = sqs._clone()
+                    sqs.query.add_term_filter(field, value)
+                else:
+                    sqs = sqs.narrow(u'%s:"%s"' % (field, sqs.query.clean(value)))
 
         return sqs
@@ -0,0 +1,127 @@
+from collections import deque
+from django.conf import settings
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger('search.slow_queries')
+
+
+def query_shape(body):
+    '''
+    A short description of a search body's structure without its values, like "filtered(match)+facets",
+    so searches can be grouped by the kind of query Elasticsearch has to run
+    '''
+    query = body.get('query', {})
+    if 'filtered' in query:
+        inner = query['filtered'].get('query', {})
+        shape = 'filtered({})'.format('+'.join(sorted(inner.keys())) or 'none')
+    else:
+        shape = '+'.join(sorted(query.keys())) or 'none'
+    for extra in ('facets', 'highlight', 'suggest', 'sort'):
+        if extra in body:
+            shape += '+' + extra
+    return shape
+
+
+class RollingHistogram(object):
+
+    """The last size durations of something, for percentiles over recent requests."""
+
+    def __init__(self, size=1000):
+        self.durations = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, seconds):
+        self.durations.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        durations = sorted(self.durations)
+        summary = {'count': self.count, 'window': len(durations)}
+        if not durations:
+            return summary
+
+        def percentile(p):
+            return durations[min(int(len(durations) * p / 100), len(durations) - 1)] * 1000
+
+        summary.update({
+            'mean_ms': sum(durations) / len(durations) * 1000,
+            'p50_ms': percentile(50),
+            'p90_ms': percentile(90),
+            'p99_ms': percentile(99),
+            'max_ms': durations[-1] * 1000,
+        })
+        return summary
+
+
+class SearchStats(object):
+
+    """
+    Timings of backend calls in this process: a RollingHistogram of wall-clock time and of Elasticsearch's
+    own "took" per kind of call (search, more_like_this, analyze_text) and query shape, total hits, the
+    number of shards searched, and the most recent calls slower than SEARCH_SLOW_QUERY_THRESHOLD seconds,
+    which are also logged.
+    """
+
+    def __init__(self, histogram_size=1000, slow_log_size=50):
+        self.histogram_size = histogram_size
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.took_histograms = {}
+        self.hits = {}
+        self.shards = {}
+        self.slow_queries = deque(maxlen=slow_log_size)
+
+    def record(self, kind, shape, seconds, took=None, hits=None, shards=None, body=None):
+        key = '{}:{}'.format(kind, shape)
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = RollingHistogram(self.histogram_size)
+                self.took_histograms[key] = RollingHistogram(self.histogram_size)
+                self.hits[key] = 0
+                self.shards[key] = None
+            self.histograms[key].add(seconds)
+            if took is not None:
+                self.took_histograms[key].add(took / 1000)
+            self.hits[key] += hits or 0
+            if shards is not None:
+                self.shards[key] = shards
+
+        threshold = getattr(settings, 'SEARCH_SLOW_QUERY_THRESHOLD', 0.5)
+        if threshold is not None and seconds >= threshold:
+            entry = {
+                'kind': kind,
+                'shape': shape,
+                'ms': seconds * 1000,
+                'took_ms': took,
+                'hits': hits,
+                'shards': shards,
+                'body': body,
+                'at': time.time(),
+            }
+            self.slow_queries.append(entry)
+            logger.warning('Slow %s (%s) took %.0fms (Elasticsearch: %sms, %s hits): %s', kind, shape,
+                           seconds * 1000, took, hits, json.dumps(body, default=str))
+
+    def summary(self):
+        with self._lock:
+            stats = {}
+            for key, histogram in self.histograms.items():
+                stats[key] = histogram.summary()
+                stats[key]['took'] = self.took_histograms[key].summary()
+                stats[key]['hits'] = self.hits[key]
+                stats[key]['shards'] = self.shards[key]
+            return {'queries': stats, 'slow_queries': list(self.slow_queries)}
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.took_histograms.clear()
+            self.hits.clear()
+            self.shards.clear()
+            self.slow_queries.clear()
+
+
+search_stats = SearchStats()
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from search.autocomplete import Vocabulary
+import random
+import time
+
+
+class Command(BaseCommand):
+    help = 'Builds the autocomplete vocabulary and reports its size and prefix lookup latency percentiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--lookups',
+                            type=int,
+                            dest='lookups',
+                            default=10000,
+                            help='Number of prefix lookups to time')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        vocabulary = Vocabulary(Vocabulary.load_frequencies())
+        build_ms = (time.perf_counter() - start) * 1000
+        self.stdout.write("{} terms, {} keys, built in {:.1f} ms".format(len(vocabulary), len(vocabulary.keys),
+                                                                         build_ms))
+        if not vocabulary.keys:
+            return
+
+        # Prefixes of 1 to 6 characters of random keys, like a user typing
+        prefixes = []
+        for i in range(max(options.get('lookups', 10000), 1)):
+            key = random.choice(vocabulary.keys)
+            prefixes.append(key[:random.randint(1, 6)])
+
+        timings = []
+        for prefix in prefixes:
+            start = time.perf_counter()
+            vocabulary.complete(prefix, limit=100)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+
+        def percentile(p):
+            return timings[min(int(len(timings) * p / 100), len(timings) - 1)]
+
+        self.stdout.write("p50_ms\tp90_ms\tp99_ms\tmax_ms")
+        self.stdout.write("{:.3f}\t{:.3f}\t{:.3f}\t{:.3f}".format(percentile(50), percentile(90),
+                                                                  percentile(99), timings[-1]))
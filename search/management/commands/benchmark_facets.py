@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from search.query import sqs
+import time
+
+
+class Command(BaseCommand):
+    help = ('Times searches narrowed by more and more selected facets, with term filters and with '
+            'query_string (fquery) filters, against the configured Elasticsearch')
+
+    def add_arguments(self, parser):
+        parser.add_argument('-q', '--query',
+                            dest='query',
+                            default='*:*',
+                            help='Search to narrow (default: everything)')
+        parser.add_argument('-r', '--repeat',
+                            type=int,
+                            dest='repeat',
+                            default=20,
+                            help='Number of times to run each search')
+        parser.add_argument('--max-facets',
+                            type=int,
+                            dest='max_facets',
+                            default=8,
+                            help='Largest number of selected facets to try')
+
+    def selected_facets(self, max_facets):
+        '''The most common value of each facet field in turn, as "field_exact:value" strings'''
+        counts = sqs.all().facet_counts().get('fields', {})
+        values = dict((field, [value for value, count in field_counts if count])
+                      for field, field_counts in counts.items())
+        selected = []
+        depth = 0
+        while len(selected) < max_facets and any(len(v) > depth for v in values.values()):
+            for field in sorted(values):
+                if len(values[field]) > depth and len(selected) < max_facets:
+                    selected.append((field + '_exact', values[field][depth]))
+            depth += 1
+        return selected
+
+    def time_search(self, searchqueryset, repeat):
+        timings = []
+        took = []
+        backend = searchqueryset.query.backend
+        for i in range(repeat):
+            search = searchqueryset._clone()
+            start = time.perf_counter()
+            search.count()
+            timings.append(time.perf_counter() - start)
+            took.append(backend._current.took or 0)
+        timings.sort()
+        return (sum(timings) / len(timings) * 1000, timings[len(timings) // 2] * 1000,
+                timings[min(int(len(timings) * 0.9), len(timings) - 1)] * 1000, sum(took) / len(took))
+
+    def handle(self, *args, **options):
+        repeat = max(options.get('repeat', 20), 1)
+        base = sqs.raw_search(options['query']) if options['query'] != '*:*' else sqs.all()
+        selected = self.selected_facets(options['max_facets'])
+
+        self.stdout.write("facets\tfilter\thits\tmean_ms\tp50_ms\tp90_ms\tmean_took_ms")
+        for num_facets in range(len(selected) + 1):
+            term_search = base._clone()
+            narrow_search = base._clone()
+            for field, value in selected[:num_facets]:
+                term_search.query.add_term_filter(field, value)
+                narrow_search = narrow_search.narrow(u'%s:"%s"' % (field, narrow_search.query.clean(value)))
+            for name, search in (('term', term_search), ('query_string', narrow_search)):
+                hits = search._clone().count()
+                self.stdout.write("{}\t{}\t{}\t{:.1f}\t{:.1f}\t{:.1f}\t{:.1f}".format(
+                    num_facets, name, hits, *self.time_search(search, repeat)))
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+from haystack import connections as haystack_connections
+from search.cache import bump_index_generation
+from search.rebuild import index_pk_range, plan_rebuild, swap_alias
+from multiprocessing import Pool, cpu_count
+import time
+
+
+def index_job(args):
+    using, label, index_name, first_pk, last_pk, bulk_size = args
+    return index_pk_range(using, label, index_name, first_pk, last_pk, bulk_size=bulk_size)
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds search indexes without downtime: fills a new versioned index from parallel worker '
+            'processes, then moves the index name (an alias) to it')
+
+    def add_arguments(self, parser):
+        parser.add_argument('-u', '--using',
+                            action='append',
+                            dest='using',
+                            help='Haystack connection to rebuild (can be repeated; default: all)')
+        parser.add_argument('-w', '--workers',
+                            type=int,
+                            dest='workers',
+                            default=cpu_count(),
+                            help='Number of worker processes')
+        parser.add_argument('--chunk-size',
+                            type=int,
+                            dest='chunk_size',
+                            default=1000,
+                            help='Number of objects per worker job')
+        parser.add_argument('--bulk-size',
+                            type=int,
+                            dest='bulk_size',
+                            default=1000,
+                            help='Number of documents per Elasticsearch bulk request')
+
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+        usings = options.get('using') or list(haystack_connections.connections_info.keys())
+        workers = max(options.get('workers') or 1, 1)
+
+        for using in usings:
+            start = time.perf_counter()
+            started_at = timezone.now()
+            index_name, jobs = plan_rebuild(using, chunk_size=options['chunk_size'])
+            if verbosity > 0:
+                self.stdout.write("Indexing '{}' into {} in {} jobs".format(using, index_name, len(jobs)))
+
+            # Forked workers must open their own database connections
+            connections.close_all()
+            pool = Pool(processes=workers)
+            try:
+                indexed = sum(pool.imap_unordered(index_job, [job + (options['bulk_size'],) for job in jobs]))
+            finally:
+                pool.close()
+                pool.join()
+
+            old_indexes = swap_alias(using, index_name, since=started_at)
+            if verbosity > 0:
+                self.stdout.write("Indexed {} documents in {:.1f}s; '{}' now points to {}{}".format(
+                    indexed, time.perf_counter() - start, using, index_name,
+                    " (replacing {})".format(", ".join(old_indexes)) if old_indexes else ""))
+
+        bump_index_generation()
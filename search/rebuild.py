@@ -0,0 +1,133 @@
+from django.apps import apps
+from django.utils import timezone
+from elasticsearch.helpers import bulk
+from haystack import connections as haystack_connections
+from haystack.constants import ID
+from common.utils import chunked
+
+
+def versioned_index_name(alias):
+    return '{}_{}'.format(alias, timezone.now().strftime('%Y%m%d%H%M%S'))
+
+
+def get_backend(using, index_name=None):
+    '''
+    A new haystack backend for a connection, writing to index_name instead of its own index if given.
+    (The connection's own backend is shared by searches in this process, so it's left alone.)
+    '''
+    engine = haystack_connections[using]
+    backend = engine.backend(using, **engine.options)
+    if index_name is not None:
+        backend.index_name = index_name
+    return backend
+
+
+def model_label(model):
+    return '{}.{}'.format(model._meta.app_label, model._meta.model_name)
+
+
+def create_versioned_index(using):
+    '''Create a new, empty index with the connection's settings and mappings, returning its name'''
+    alias = get_backend(using).index_name
+    index_name = versioned_index_name(alias)
+    # setup() creates the index and puts the mapping for the backend's index_name
+    backend = get_backend(using, index_name)
+    backend.setup()
+    # Refreshing while bulk indexing only slows it down; swap_alias turns it back on
+    backend.conn.indices.put_settings(index=index_name, body={'index': {'refresh_interval': '-1'}})
+    return index_name
+
+
+def pk_ranges(queryset, chunk_size):
+    '''Split a queryset into (first pk, last pk) ranges of up to chunk_size objects'''
+    pks = queryset.order_by('pk').values_list('pk', flat=True).iterator()
+    return [(chunk[0], chunk[-1]) for chunk in chunked(pks, chunk_size)]
+
+
+def plan_rebuild(using, chunk_size=1000):
+    '''
+    Create a versioned index for a connection and split the work of filling it into
+    (using, model label, index name, first pk, last pk) jobs for index_pk_range
+    '''
+    index_name = create_versioned_index(using)
+    unified_index = haystack_connections[using].get_unified_index()
+    jobs = []
+    for model in unified_index.get_indexed_models():
+        search_index = unified_index.get_index(model)
+        for first_pk, last_pk in pk_ranges(search_index.index_queryset(using=using), chunk_size):
+            jobs.append((using, model_label(model), index_name, first_pk, last_pk))
+    return index_name, jobs
+
+
+def bulk_index(backend, search_index, objects, index_name, bulk_size=1000):
+    '''
+    Prepare the documents for objects and send them to index_name in bulk requests, returning how many
+    were indexed. A document Elasticsearch rejects raises BulkIndexError, so a rebuild stops before
+    swap_alias can point the alias at an index that's missing it.
+    '''
+    def actions():
+        for obj in objects:
+            prepared = search_index.full_prepare(obj)
+            document = dict((key, backend._from_python(value)) for key, value in prepared.items())
+            document['_id'] = document[ID]
+            yield document
+
+    # elasticsearch-py 1.x only logs failed items unless raise_on_error is set
+    indexed, errors = bulk(backend.conn, actions(), index=index_name, doc_type='modelresult',
+                           chunk_size=bulk_size, raise_on_error=True)
+    return indexed
+
+
+def index_pk_range(using, label, index_name, first_pk, last_pk, bulk_size=1000):
+    '''Index a range of a model's objects into index_name'''
+    model = apps.get_model(label)
+    backend = get_backend(using, index_name)
+    search_index = haystack_connections[using].get_unified_index().get_index(model)
+    queryset = search_index.index_queryset(using=using).filter(pk__gte=first_pk, pk__lte=last_pk)
+    return bulk_index(backend, search_index, queryset.iterator(), index_name, bulk_size=bulk_size)
+
+
+def catch_up(using, index_name, since, bulk_size=1000):
+    '''
+    Reindex into index_name the objects changed since the rebuild started. Updates made during the
+    rebuild went through the alias to the old index, so they'd be lost at the swap otherwise. Models
+    without an updated field are reindexed in full. Returns the number of objects reindexed.
+    '''
+    backend = get_backend(using, index_name)
+    unified_index = haystack_connections[using].get_unified_index()
+    count = 0
+    for model in unified_index.get_indexed_models():
+        search_index = unified_index.get_index(model)
+        queryset = search_index.build_queryset(using=using, start_date=since)
+        count += bulk_index(backend, search_index, queryset.iterator(), index_name, bulk_size=bulk_size)
+    return count
+
+
+def swap_alias(using, index_name, since=None):
+    '''
+    Point the connection's index name, as an alias, at index_name alone, and delete the indexes it
+    pointed at before. If since (when the rebuild started) is given, objects changed since then are
+    reindexed into index_name first. The alias moves in one atomic request, except when the name
+    still belongs to a real index (before the first versioned rebuild), which has to be deleted first.
+    '''
+    if since is not None:
+        catch_up(using, index_name, since)
+    alias = get_backend(using).index_name
+    conn = get_backend(using, index_name).conn
+    conn.indices.put_settings(index=index_name, body={'index': {'refresh_interval': '1s'}})
+    conn.indices.refresh(index=index_name)
+
+    old_indexes = []
+    if conn.indices.exists_alias(name=alias):
+        old_indexes = list(conn.indices.get_alias(name=alias).keys())
+    elif conn.indices.exists(index=alias):
+        conn.indices.delete(index=alias)
+
+    actions = [{'remove': {'index': old_index, 'alias': alias}} for old_index in old_indexes]
+    actions.append({'add': {'index': index_name, 'alias': alias}})
+    conn.indices.update_aliases(body={'actions': actions})
+
+    for old_index in old_indexes:
+        if old_index != index_name:
+            conn.indices.delete(index=old_index, ignore=404)
+    return old_indexes
@@ -0,0 +1,153 @@
+from django.apps import apps
+from haystack.models import SearchResult
+from haystack.query import EmptySearchQuerySet
+from haystack.utils import get_model_ct
+from common.utils import chunked
+from search.cache import search_results_cache
+
+
+class SearchResultIds(object):
+
+    """
+    Iterates over the primary keys of every result of a SearchQuerySet, in search order.
+
+    Instead of paging through full results the way a SearchQuerySet does, this asks
+    Elasticsearch for document ids only (no stored fields, facets or highlighting) and
+    scrolls through them in large batches. It can only be iterated once.
+    """
+
+    def __init__(self, searchqueryset, model, batch_size=1000, scroll='2m'):
+        self.searchqueryset = searchqueryset
+        self.model = model
+        self.batch_size = batch_size
+        self.scroll = scroll
+        self._response = None
+
+    @property
+    def backend(self):
+        return self.searchqueryset.query.backend
+
+    def build_body(self):
+        query = self.searchqueryset.models(self.model).query
+        params = query.build_params()
+        if query._raw_query:
+            query_string = query._raw_query
+            params.update(query._raw_query_params)
+        else:
+            query_string = query.build_query()
+
+        body = self.backend.build_search_kwargs(query_string, **params)
+        for key in ('facets', 'highlight', 'suggest'):
+            body.pop(key, None)
+        body['fields'] = []
+        return body
+
+    def first_page(self):
+        if self._response is None:
+            if isinstance(self.searchqueryset, EmptySearchQuerySet):
+                self._response = {'hits': {'total': 0, 'hits': []}}
+            else:
+                if not self.backend.setup_complete:
+                    self.backend.setup()
+                self._response = self.backend.conn.search(body=self.build_body(),
+                                                          index=self.backend.index_name,
+                                                          doc_type='modelresult',
+                                                          scroll=self.scroll,
+                                                          size=self.batch_size)
+        return self._response
+
+    @property
+    def total(self):
+        return self.first_page()['hits']['total']
+
+    def __iter__(self):
+        prefix = '{}.'.format(get_model_ct(self.model))
+        response = self.first_page()
+        scroll_id = response.get('_scroll_id', None)
+        try:
+            while response['hits']['hits']:
+                for hit in response['hits']['hits']:
+                    if hit['_id'].startswith(prefix):
+                        yield int(hit['_id'][len(prefix):])
+                response = self.backend.conn.scroll(scroll_id=scroll_id, scroll=self.scroll)
+                scroll_id = response.get('_scroll_id', scroll_id)
+        finally:
+            if scroll_id:
+                self.backend.conn.clear_scroll(scroll_id=scroll_id, ignore=404)
+
+
+def hydrate(ids, queryset, chunk_size=500):
+    '''Fetch objects from queryset for an iterable of ids, a chunk at a time, yielding them in id order'''
+    for chunk in chunked(ids, chunk_size):
+        objects = queryset.in_bulk(chunk)
+        for pk in chunk:
+            if pk in objects:
+                yield objects[pk]
+
+
+class CachedSearchResults(object):
+
+    """
+    Stands in for a SearchQuerySet in paginated search views. The hit total and facet counts,
+    and the hits for each slice (page) of results, are kept in search.cache.search_results_cache
+    under cache_key, so repeating a search only loads the result objects from the database.
+    """
+
+    def __init__(self, searchqueryset, cache_key):
+        self.searchqueryset = searchqueryset
+        self.cache_key = cache_key
+        self._results = {}
+
+    def summary(self):
+        key = '{}:summary'.format(self.cache_key)
+        summary = search_results_cache.get(key)
+        if summary is None:
+            summary = {
+                'total': self.searchqueryset.count(),
+                'facets': self.searchqueryset.facet_counts(),
+            }
+            search_results_cache.set(key, summary)
+        return summary
+
+    def count(self):
+        return self.summary()['total']
+
+    def __len__(self):
+        return self.count()
+
+    def facet_counts(self):
+        return self.summary()['facets']
+
+    def load_results(self, hits):
+        '''Build SearchResults for (app_label, model_name, pk, score) hits, loading objects with one query per model'''
+        pks_by_model = {}
+        for app_label, model_name, pk, score in hits:
+            pks_by_model.setdefault((app_label, model_name), []).append(pk)
+        objects = {}
+        for (app_label, model_name), pks in pks_by_model.items():
+            model = apps.get_model(app_label, model_name)
+            for pk, obj in model._default_manager.in_bulk(pks).items():
+                objects[(app_label, model_name, str(pk))] = obj
+
+        results = []
+        for app_label, model_name, pk, score in hits:
+            obj = objects.get((app_label, model_name, str(pk)), None)
+            if obj is not None:
+                result = SearchResult(app_label, model_name, pk, score)
+                result._object = obj
+                results.append(result)
+        return results
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice):
+            return self[k:k + 1][0]
+
+        start, stop = k.start or 0, k.stop
+        if (start, stop) not in self._results:
+            key = '{}:{}:{}'.format(self.cache_key, start, stop)
+            hits = search_results_cache.get(key)
+            if hits is None:
+                hits = [(r.app_label, r.model_name, r.pk, r.score) for r in self.searchqueryset[start:stop]]
+                search_results_cache.set(key, hits)
+            self._results[(start, stop)] = self.load_results(hits)
+        return self._results[(start, stop)]
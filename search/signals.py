@@ -0,0 +1,94 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.signals import request_finished
+from django.db.models import signals
+from haystack.signals import BaseSignalProcessor
+from celery.signals import task_postrun
+import atexit
+import threading
+
+PENDING_KEY = 'search:pending:{}.{}'
+
+
+def shared_cache():
+    '''Whether the default cache is seen by every process (rather than in-memory per process, or a dummy)'''
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def queue_search_update(model, pks):
+    '''
+    Queue objects that were saved without signals (by bulk_create or a queryset update) the way
+    QueuedSignalProcessor queues saved ones. Call it after the transaction that saved them commits.
+    '''
+    from haystack import signal_processor
+
+    if isinstance(signal_processor, QueuedSignalProcessor):
+        signal_processor.enqueue(model, *pks)
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+
+    """
+    Queues saved and deleted objects of SEARCH_QUEUED_MODELS for search.tasks.update_search_objects,
+    rather than updating the index in the request.
+
+    Objects are deduplicated by pk and sent as one task at the end of each request or celery task
+    (or every SEARCH_UPDATE_BATCH_SIZE objects, for long-running scripts), to run SEARCH_UPDATE_DELAY
+    seconds later. With a shared cache (CACHE_URL), an object already waiting in a task that hasn't
+    started yet isn't queued again.
+    """
+
+    def setup(self):
+        self._lock = threading.Lock()
+        self._pending = set()
+        for label in getattr(settings, 'SEARCH_QUEUED_MODELS', ('cjdata.Dataset', 'cjdata.Category')):
+            model = apps.get_model(label)
+            signals.post_save.connect(self.handle_save, sender=model)
+            signals.post_delete.connect(self.handle_delete, sender=model)
+        request_finished.connect(self.flush)
+        # Celery workers don't finish requests, so saves made in tasks are sent when the task ends
+        task_postrun.connect(self.flush)
+        atexit.register(self.flush)
+
+    def teardown(self):
+        for label in getattr(settings, 'SEARCH_QUEUED_MODELS', ('cjdata.Dataset', 'cjdata.Category')):
+            model = apps.get_model(label)
+            signals.post_save.disconnect(self.handle_save, sender=model)
+            signals.post_delete.disconnect(self.handle_delete, sender=model)
+        request_finished.disconnect(self.flush)
+        task_postrun.disconnect(self.flush)
+
+    def enqueue(self, sender, *pks):
+        label = '{}.{}'.format(sender._meta.app_label, sender._meta.model_name)
+        with self._lock:
+            self._pending.update((label, pk) for pk in pks)
+            full = len(self._pending) >= getattr(settings, 'SEARCH_UPDATE_BATCH_SIZE', 500)
+        if full:
+            self.flush()
+
+    def handle_save(self, sender, instance, **kwargs):
+        self.enqueue(sender, instance.pk)
+
+    def handle_delete(self, sender, instance, **kwargs):
+        self.enqueue(sender, instance.pk)
+
+    def flush(self, **kwargs):
+        from search.tasks import update_search_objects
+
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        if not pending:
+            return
+        delay = getattr(settings, 'SEARCH_UPDATE_DELAY', 5)
+        if shared_cache():
+            # cache.add is atomic, so only the first process to queue an object sends it
+            keys = [[label, pk] for label, pk in sorted(pending)
+                    if cache.add(PENDING_KEY.format(label, pk), 1, delay * 10)]
+        else:
+            # The worker couldn't clear another process's marker, so every change is sent
+            keys = [[label, pk] for label, pk in sorted(pending)]
+        if keys:
+            update_search_objects.apply_async((keys,), countdown=delay)
@@ -0,0 +1,51 @@
+from celery import shared_task
+from django.apps import apps
+from django.core.cache import cache
+from elasticsearch.helpers import bulk
+from haystack import connections as haystack_connections
+from haystack.exceptions import NotHandled
+from search.cache import bump_index_generation
+from search.signals import PENDING_KEY
+
+
+@shared_task
+def update_search_objects(keys):
+    '''
+    Bring the search indexes up to date for [model label, pk] keys queued by QueuedSignalProcessor:
+    objects that are still in their index's queryset are reindexed, and the rest are removed,
+    with one bulk request per model and connection
+    '''
+    pks_by_label = {}
+    for label, pk in keys:
+        # Clear the queued marker before reading, so any later change is queued again
+        cache.delete(PENDING_KEY.format(label, pk))
+        pks_by_label.setdefault(label, set()).add(pk)
+
+    for label, pks in pks_by_label.items():
+        model = apps.get_model(label)
+        for using in haystack_connections.connections_info:
+            try:
+                index = haystack_connections[using].get_unified_index().get_index(model)
+            except NotHandled:
+                continue
+            backend = haystack_connections[using].get_backend()
+            objects = list(index.index_queryset(using=using).filter(pk__in=pks))
+            if objects:
+                backend.update(index, objects)
+            removed = pks - set(obj.pk for obj in objects)
+            if removed:
+                actions = [{
+                    '_op_type': 'delete',
+                    '_index': backend.index_name,
+                    '_type': 'modelresult',
+                    '_id': '{}.{}'.format(label, pk),
+                } for pk in removed]
+                # Deleting a document that was never indexed is fine
+                bulk(backend.conn, actions, raise_on_error=False)
+
+    bump_index_generation()
+    if 'cjdata.dataset' in pks_by_label:
+        from cjdata.tasks import update_related_datasets
+        # Give the index a refresh (every second) to make the changes searchable first
+        update_related_datasets.apply_async((sorted(pks_by_label['cjdata.dataset']),), countdown=2)
+    return len(keys)
@@ -0,0 +1,39 @@
+from datetime import timedelta
+from unittest import mock
+from django.test import TestCase
+from django.utils import timezone
+from elasticsearch.helpers import BulkIndexError
+from cjdata.models import Dataset
+from search.rebuild import index_pk_range, swap_alias
+
+
+def rejecting_bulk(actions, **kwargs):
+    '''A bulk response in which Elasticsearch rejected every document'''
+    items = [{'index': {'_id': action['index']['_id'], 'status': 400, 'error': 'MapperParsingException'}}
+             for action in actions if 'index' in action]
+    return {'errors': True, 'items': items}
+
+
+class RebuildTests(TestCase):
+
+    def setUp(self):
+        # bulk_create, so no search index updates are queued
+        Dataset.objects.bulk_create([Dataset(title='Arrests', group_name='Group')])
+        self.dataset = Dataset.objects.get()
+        self.backend = mock.Mock()
+        self.backend._from_python.side_effect = lambda value: value
+        self.backend.conn.bulk.side_effect = rejecting_bulk
+        patcher = mock.patch('search.rebuild.get_backend', return_value=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rejected_documents_fail_the_range(self):
+        with self.assertRaises(BulkIndexError):
+            index_pk_range('default', 'cjdata.dataset', 'hall_of_justice_1', self.dataset.pk, self.dataset.pk)
+
+    def test_rejected_catch_up_keeps_the_alias(self):
+        with self.assertRaises(BulkIndexError):
+            swap_alias('default', 'hall_of_justice_1', since=timezone.now() - timedelta(hours=1))
+        self.assertTrue(self.backend.conn.bulk.called)
+        self.assertFalse(self.backend.conn.indices.update_aliases.called)
+        self.assertFalse(self.backend.conn.indices.delete.called)
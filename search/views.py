@@ -1,22 +1,35 @@
+from haystack import connections as haystack_connections
 from haystack.views import FacetedSearchView
 from haystack.generic_views import SearchMixin
-from haystack.query import SearchQuerySet
+from haystack.query import EmptySearchQuerySet
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.utils.decorators import method_decorator
 from django.views.generic import View
 from django.views.generic.base import TemplateView
 from django.http import JsonResponse
 from search.forms import PliableFacetedSearchForm
+from search.autocomplete import MAX_COMPLETIONS, autocomplete_vocabulary
+from search.cache import search_cache_key
+from search.clients import connection_stats
+from search.instrumentation import search_stats
+from search.results import CachedSearchResults, SearchResultIds, hydrate
 from cjdata.models import Dataset
-from common.utils import generate_csv
+from common.utils import export_fieldnames, generate_csv
 from django.http import StreamingHttpResponse
 
 
-import collections
-
-basestring = (str, bytes)
-
-
 class BetterFacetedSearchView(FacetedSearchView):
 
+    def get_results(self):
+        results = super(BetterFacetedSearchView, self).get_results()
+        if isinstance(results, EmptySearchQuerySet):
+            return results
+        cache_key = search_cache_key(self.form.cleaned_data.get('q', ''),
+                                     self.form.selected_facets,
+                                     self.form.cleaned_data.get('parse_query', False))
+        return CachedSearchResults(results, cache_key)
+
     def extra_context(self):
         extra = super(BetterFacetedSearchView, self).extra_context()
 
@@ -31,22 +44,35 @@ class AutocompleteView(View):
     """provides autocompletion JSON endpoint"""
 
     def get(self, request, *args, **kwargs):
-        def flatten(l):
-            for el in l:
-                if isinstance(el, collections.Iterable) and not isinstance(el, basestring):
-                    for sub in flatten(el):
-                        yield sub
-                else:
-                    yield el
-        query = request.GET.get('q', '').lower()
-        sqs = SearchQuerySet().using('autocomplete').filter(content=query)
+        query = request.GET.get('q', '')
+        try:
+            limit = max(int(request.GET.get('limit', MAX_COMPLETIONS)), 1)
+        except ValueError:
+            limit = MAX_COMPLETIONS
+        suggestions = autocomplete_vocabulary().complete(query, limit=limit)
+
+        return JsonResponse({'results': [{'value': term} for term in suggestions]})
 
-        # texts = ((t for t in s) if not s.__hash__ else s.text for s in sqs)
-        texts = flatten((s.text for s in sqs))
-        lower_texts = (t.lower() for t in texts)
-        suggestions = ({'value': p.title()} for p in set(lower_texts) if query.lower() in p.lower())
 
-        return JsonResponse({'results': list(suggestions)[:100]})
+class SearchStatsView(View):
+    """
+    Search backend timings, slow queries and Elasticsearch connection pool counts for this process,
+    as JSON, for staff. POST resets the timings and slow queries.
+    """
+
+    @method_decorator(staff_member_required)
+    def dispatch(self, *args, **kwargs):
+        return super(SearchStatsView, self).dispatch(*args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        stats = search_stats.summary()
+        stats['slow_query_threshold'] = getattr(settings, 'SEARCH_SLOW_QUERY_THRESHOLD', 0.5)
+        stats['connections'] = connection_stats()
+        return JsonResponse(stats)
+
+    def post(self, request, *args, **kwargs):
+        search_stats.reset()
+        return JsonResponse({'reset': True})
 
 
 class AnalyzerView(TemplateView):
@@ -60,8 +86,7 @@ class AnalyzerView(TemplateView):
 
         context['query'] = query
 
-        sqs = SearchQuerySet().using('default')
-        token_dict = sqs.query.backend.analyze_text(query, analyzer='cjdata_analyzer')
+        token_dict = haystack_connections['default'].get_backend().analyze_text(query, analyzer='cjdata_analyzer')
 
         tokens = token_dict.get('tokens', None)
         for tok in tokens:
@@ -86,21 +111,15 @@ class SearchExportView(View, SearchMixin):
         form = self.get_form(form_class)
         sqs = form.search()
 
-        # Filter a queryset by pk
-        result_ids = list(r.pk for r in sqs)
-        queryset = Dataset.objects.filter(id__in=result_ids)
-
-        # Use the idx feature of postgres' intarray extension to order the same as the search order
-        sql_id_array = "'{{{}}}'::int[]".format(",".join(result_ids))
-        sql_order_expression = '(idx({}, id))'.format(sql_id_array)
-        queryset = queryset.extra(select={'ordering': sql_order_expression})
-        queryset = queryset.extra(order_by=['ordering'])
+        # Scroll through the result ids, then fetch datasets from the db in search order, a chunk at a time
+        result_ids = SearchResultIds(sqs, Dataset)
+        datasets = hydrate(result_ids, Dataset.objects.prefetch_related('categories'))
 
-        output_fieldnames = [f.name for f in Dataset._meta.get_fields() if f.name != 'id']
-        csv_data = generate_csv(queryset, output_fieldnames)
+        output_fieldnames = export_fieldnames(Dataset)
+        csv_data = generate_csv(datasets, output_fieldnames, model=Dataset)
 
         response = StreamingHttpResponse(csv_data, content_type="text/csv")
-        response['Content-Disposition'] = 'attachment; filename="criminal-justice-{}-rows.csv"'.format(sqs.count())
+        response['Content-Disposition'] = 'attachment; filename="criminal-justice-{}-rows.csv"'.format(result_ids.total)
         return response
 
     def get_form_kwargs(self):